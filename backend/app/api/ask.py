@@ -67,6 +67,8 @@ async def ask_question(
                 elif event["type"] == "citation":
                     citations_data.append(event["citation"])
                     yield f"data: {json.dumps(event)}\n\n"
+                elif event["type"] == "timing":
+                    yield f"data: {json.dumps(event)}\n\n"
                 elif event["type"] == "error":
                     yield f"data: {json.dumps(event)}\n\n"
                     return
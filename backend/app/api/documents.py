@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List
 import uuid
+import json
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import get_current_admin, get_current_user
 from app.models.user import User
 from app.models.document import Document
 from app.services.storage import storage_service
-from app.services.worker import enqueue_ingest_job, get_job_status
+from app.services.worker import (
+    enqueue_ingest_job, enqueue_reingest_job, get_job_status, get_queue_metrics, get_worker_health
+)
+from app.services.progress import subscribe_progress
 
 router = APIRouter()
 
@@ -41,10 +46,21 @@ class DocumentResponse(BaseModel):
         from_attributes = True
 
 
+class ReingestRequest(BaseModel):
+    pages: List[int]
+
+
 class IngestStatusResponse(BaseModel):
     status: str
     progress: float | None = None
     error_message: str | None = None
+    stage: str | None = None
+    pages_done: int | None = None
+    pages_total: int | None = None
+    chunks_embedded: int | None = None
+    chunks_total_estimate: int | None = None
+    pages_per_second: float | None = None
+    eta_seconds: float | None = None
 
 
 @router.get("/presign", response_model=PresignResponse)
@@ -98,8 +114,20 @@ def ingest_document(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    # Estimate cost from the uploaded object's size for queue routing
+    file_size = None
+    try:
+        file_size = storage_service.get_object_size(f"{current_user.id}/{doc_id}/{document.filename}")
+    except Exception as e:
+        print(f"Failed to read object size: {e}")
+    
     # Enqueue worker job
-    job = enqueue_ingest_job(doc_id=doc_id, user_id=str(current_user.id))
+    job = enqueue_ingest_job(
+        doc_id=doc_id,
+        user_id=str(current_user.id),
+        file_size=file_size,
+        page_count=document.page_count
+    )
     
     # Update status
     document.status = "queued"
@@ -116,6 +144,30 @@ def ingest_document(
     )
 
 
+@router.post("/documents/{doc_id}/reingest")
+def reingest_pages(
+    doc_id: str,
+    request: ReingestRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Re-process only the given pages; unchanged chunks keep their vectors"""
+    document = db.query(Document).filter(
+        Document.id == uuid.UUID(doc_id),
+        Document.user_id == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.status != "done":
+        raise HTTPException(status_code=409, detail="Document has not finished ingesting")
+    if not request.pages or min(request.pages) < 1:
+        raise HTTPException(status_code=400, detail="Pages must be 1-indexed page numbers")
+    
+    job = enqueue_reingest_job(doc_id=doc_id, user_id=str(current_user.id), pages=sorted(set(request.pages)))
+    return {"success": True, "job_id": job.id}
+
+
 @router.get("/ingest/status", response_model=IngestStatusResponse)
 def get_ingest_status(
     doc_id: str = Query(...),
@@ -136,13 +188,66 @@ def get_ingest_status(
     if document.status in ["queued", "running"]:
         job_status = get_job_status(doc_id)
     
+    job_status = job_status or {}
     return IngestStatusResponse(
         status=document.status,
-        progress=job_status.get("progress") if job_status else None,
-        error_message=document.error_message
+        progress=job_status.get("progress"),
+        error_message=document.error_message,
+        stage=job_status.get("stage"),
+        pages_done=job_status.get("pages_done"),
+        pages_total=job_status.get("pages_total"),
+        chunks_embedded=job_status.get("chunks_embedded"),
+        chunks_total_estimate=job_status.get("chunks_total_estimate"),
+        pages_per_second=job_status.get("pages_per_second"),
+        eta_seconds=job_status.get("eta_seconds")
     )
 
 
+@router.get("/ingest/events")
+async def stream_ingest_progress(
+    doc_id: str = Query(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Push ingestion progress as SSE instead of polling /ingest/status"""
+    document = db.query(Document).filter(
+        Document.id == uuid.UUID(doc_id),
+        Document.user_id == current_user.id
+    ).first()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Extract values before async generator to avoid SQLAlchemy session issues
+    document_status = document.status
+    error_message = document.error_message
+    
+    async def event_stream():
+        if document_status in ["done", "error"]:
+            yield f"data: {json.dumps({'stage': document_status, 'error': error_message})}\n\n"
+            return
+        async for snapshot in subscribe_progress(doc_id):
+            if snapshot is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(snapshot)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+
+@router.get("/ingest/queues")
+def get_ingest_queues(current_user: User = Depends(get_current_admin)):
+    """Per-queue depth and wait-time metrics plus worker health (hosts, PIDs) for sizing the pool; admins only"""
+    return {"queues": get_queue_metrics(), "workers": get_worker_health()}
+
+
 @router.get("/documents", response_model=List[DocumentResponse])
 def list_documents(
     current_user: User = Depends(get_current_user),
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -15,11 +15,14 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET: str = "textbook-pdfs"
     MINIO_SECURE: bool = False
+    STORAGE_DOWNLOAD_THREADS: int = 8  # Parallel ranged GETs per download
+    STORAGE_PART_SIZE_MB: int = 8
     
     # Auth
     JWT_SECRET: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 10080  # 1 week
+    ADMIN_EMAILS: List[str] = []  # Users allowed the operational endpoints (e.g. /api/ingest/queues)
     
     # OpenAI
     OPENAI_API_KEY: str = ""
@@ -32,10 +35,104 @@ class Settings(BaseSettings):
     # Models
     BGE_M3_MODEL_PATH: str = "BAAI/bge-m3"
     BGE_RERANKER_MODEL_PATH: str = "BAAI/bge-reranker-base"
+    # Embedding inference: torch (FP32), torch_int8 (dynamically quantized
+    # Linear layers) or onnx (ONNX Runtime; export with scripts/export_onnx.py)
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_DIR: str = "/models/bge-m3-onnx"
+    EMBEDDING_THREADS: int = 0  # Inference threads; 0 keeps the library default (all cores)
+    # Ingestion batches are sorted by token length and sized so batch size x
+    # longest text stays under this many (padded) tokens
+    EMBEDDING_BATCH_TOKENS: int = 16384
+    EMBEDDING_MAX_BATCH_SIZE: int = 128
+    # Shared embedding server (python -m app.services.embedding_server): one model
+    # copy per pod, reached over a Unix socket, with micro-batching
+    EMBEDDING_SERVER_ENABLED: bool = False
+    EMBEDDING_SERVER_SOCKET: str = "/run/embedder/embedder.sock"
+    EMBEDDING_SERVER_MAX_BATCH: int = 64
+    EMBEDDING_SERVER_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_SERVER_TIMEOUT_SECONDS: float = 300.0
+    
+    # Embedding cache (ingestion)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "/data/faiss/_embedding_cache"
+    EMBEDDING_CACHE_MAX_MB: int = 1024
+    
+    # Query embedding cache (API), keyed by whitespace- and case-folded text
+    QUERY_CACHE_ENABLED: bool = True
+    QUERY_CACHE_MAX_ENTRIES: int = 10000  # Per process; ~4 KB each
+    QUERY_CACHE_TTL_SECONDS: int = 86400
+    QUERY_CACHE_REDIS: bool = False  # Share embeddings between API processes through Redis
+    
+    # Vector storage
+    FAISS_DATA_DIR: str = "/data/faiss"
+    INDEX_CACHE_MAX_MB: int = 2048  # Loaded indexes kept per API process
+    # Map index files read-only so processes share them through the page cache.
+    # With the pinned faiss-cpu 1.7.4 this applies to IVF (ivf_pq) indexes only;
+    # flat and HNSW need a FAISS build with IO_FLAG_MMAP_IFC
+    INDEX_MMAP: bool = False
+    # Publish indexes to MinIO under INDEX_REMOTE_PREFIX; API nodes without the
+    # worker's FAISS_DATA_DIR fetch them into a size-bounded local disk cache
+    INDEX_REMOTE_ENABLED: bool = False
+    INDEX_REMOTE_PREFIX: str = "indexes"
+    INDEX_DISK_CACHE_DIR: str = "/var/cache/faiss"
+    INDEX_DISK_CACHE_MAX_MB: int = 20480
+    INDEX_REMOTE_REVALIDATE_SECONDS: float = 30.0  # How stale a loaded published index may get
+    # Index structure: flat (exact), hnsw_flat (float32), hnsw_sq8 / hnsw_fp16
+    # (scalar-quantized vectors), ivf_pq (product-quantized, for very large
+    # documents), or auto: flat up to INDEX_FLAT_MAX_VECTORS, else hnsw_flat
+    # with M and efConstruction scaled to the chunk count
+    INDEX_TYPE: str = "auto"
+    INDEX_FLAT_MAX_VECTORS: int = 5000
+    INDEX_HNSW_M: int = 32
+    INDEX_EF_CONSTRUCTION: int = 40
+    INDEX_EF_SEARCH: int = 16  # Lowest efSearch tried when calibrating HNSW indexes
+    INDEX_TARGET_RECALL: float = 0.95  # recall@10 HNSW efSearch is calibrated to at build time
+    SEARCH_LATENCY_BUDGET_MS: float = 20.0  # Per-query budget; efSearch is lowered to fit it
+    INDEX_PQ_M: int = 64  # Sub-quantizers, i.e. bytes per vector; must divide the dimension
+    INDEX_IVF_NPROBE: int = 16
+    # Re-ingested HNSW and IVF indexes are rebuilt in the background once this share of vectors is tombstoned
+    INDEX_COMPACT_TOMBSTONE_RATIO: float = 0.2
+    # Hybrid retrieval (ENABLE_BM25): dense and BM25 rankings merged by reciprocal rank fusion
+    HYBRID_CANDIDATES: int = 50  # Taken from each ranking before fusion
+    RRF_K: int = 60
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    # Reranking (ENABLE_RERANKER): a cross-encoder reorders the retrieved candidates
+    RERANK_CANDIDATES: int = 20  # Retrieved per question and scored in one batch
+    RERANK_BUDGET_MS: float = 300.0  # Past this the retrieval order is used as is
+    RERANK_MAX_LENGTH: int = 512  # Tokens per (question, chunk) pair
+    RERANK_CACHE_MAX_ENTRIES: int = 50000
+    
+    # Retrieval for /ask runs on its own thread pool, off the event loop
+    RETRIEVAL_MAX_CONCURRENCY: int = 4  # 0 runs retrieval inline on the event loop
+    RETRIEVAL_MAX_QUEUE: int = 64  # Waiting retrievals beyond this are rejected as busy
     
     # Worker
-    MAX_CONCURRENT_WORKERS: int = 2
+    WORKER_MODE: str = "resident"  # "resident" keeps the model loaded across jobs; "fork" forks per job
+    WORKER_MAX_JOBS: int = 50  # Resident workers exit (and are restarted) after this many jobs
+    WORKER_MAX_RSS_MB: int = 6144  # ...or once RSS grows past this
+    WORKER_HEALTH_INTERVAL_SECONDS: int = 60  # Idle resident workers re-probe the model and republish health
+    MAX_CONCURRENT_WORKERS: int = 2  # Process pool size for PDF text extraction (1 = in-process)
     INGEST_TIMEOUT_SECONDS: int = 3600
+    INGEST_MAX_RETRIES: int = 2
+    INGEST_RETRY_INTERVAL_SECONDS: int = 30
+    # Size-aware queue routing; page count is used when known from a previous run
+    INGEST_SMALL_MAX_MB: int = 10
+    INGEST_LARGE_MIN_MB: int = 100
+    INGEST_SMALL_MAX_PAGES: int = 100
+    INGEST_LARGE_MIN_PAGES: int = 800
+    # Relative share of dequeues per queue for workers listening on several
+    INGEST_QUEUE_WEIGHTS: Dict[str, int] = {"ingest-small": 6, "ingest-medium": 3, "ingest-large": 1, "default": 1}
+    INGEST_BATCH_PAGES: int = 32  # Pages extracted, embedded and persisted per batch
+    PARALLEL_EXTRACT_MIN_PAGES: int = 64  # Smaller PDFs skip the process pool
+    INGEST_BULK_METHOD: str = "executemany"  # "executemany" or "copy" (PostgreSQL only)
+    ENABLE_DEDUP: bool = True  # Reuse artifacts of byte-identical PDFs
+    INGEST_STREAMING: bool = True  # Stream PDFs into shared memory instead of a temp file
+    
+    # Chunking
+    CHUNK_STRATEGY: str = "paragraph"  # paragraph, sentence, token or cross_page
+    CHUNK_SIZE: int = 600  # Characters, or tokens for the token strategy
+    CHUNK_OVERLAP: int = 80
     
     # HMAC
     HMAC_SECRET: str = "your-hmac-secret-change-in-production"
@@ -64,3 +64,11 @@ def get_current_user(
         )
     return user
 
+
+def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.email not in settings.ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
@@ -0,0 +1,130 @@
+import fcntl
+import hashlib
+import os
+import shutil
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for per-document ingestion artifacts (FAISS
+    index and anything written next to it). Identical uploads share one
+    directory under <FAISS_DATA_DIR>/_shared/<key>; each owning document's
+    index directory becomes a symlink to it. Owners are tracked as marker
+    files, and the shared directory is removed when the last one is released.
+    """
+    
+    def __init__(self, data_dir: str):
+        self.root = os.path.join(data_dir, "_shared")
+    
+    @staticmethod
+    def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+        """sha256 of a file's bytes, read in blocks"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def key(content_hash: str, fingerprint: str) -> str:
+        """Artifacts are only reusable when produced by the same pipeline"""
+        return f"{content_hash}-{hashlib.sha256(fingerprint.encode()).hexdigest()[:12]}"
+    
+    def owners(self, key: str) -> List[Tuple[str, str]]:
+        """(user_id, doc_id) pairs currently referencing a shared artifact set"""
+        owners_dir = os.path.join(self._blob_dir(key), "owners")
+        if not os.path.isdir(owners_dir):
+            return []
+        return [tuple(name.split(".", 1)) for name in sorted(os.listdir(owners_dir))]
+    
+    def publish(self, key: str, user_id: str, doc_id: str, doc_dir: str) -> bool:
+        """
+        Move a freshly built document directory into the shared store and
+        link it back. Returns False (leaving doc_dir private) if another
+        upload already published the same key.
+        """
+        with self._lock():
+            blob_dir = self._blob_dir(key)
+            if os.path.exists(blob_dir):
+                return False
+            os.rename(doc_dir, blob_dir)
+            self._link(blob_dir, user_id, doc_id, doc_dir)
+        return True
+    
+    def link(self, key: str, user_id: str, doc_id: str, doc_dir: str) -> bool:
+        """Point doc_dir at an existing shared artifact set; False if it has gone"""
+        with self._lock():
+            blob_dir = self._blob_dir(key)
+            if not os.path.isdir(blob_dir):
+                return False
+            if os.path.isdir(doc_dir) and not os.path.islink(doc_dir):
+                shutil.rmtree(doc_dir)
+            self._link(blob_dir, user_id, doc_id, doc_dir)
+        return True
+    
+    def release(self, user_id: str, doc_id: str, doc_dir: str) -> bool:
+        """
+        Drop a document's reference if doc_dir is a shared link, deleting the
+        shared set once no owners remain. Returns False if doc_dir is not shared.
+        """
+        if not os.path.islink(doc_dir):
+            return False
+        with self._lock():
+            blob_dir = os.path.realpath(doc_dir)
+            os.unlink(doc_dir)
+            owners_dir = os.path.join(blob_dir, "owners")
+            marker = os.path.join(owners_dir, f"{user_id}.{doc_id}")
+            if os.path.exists(marker):
+                os.remove(marker)
+            if not os.path.isdir(owners_dir) or not os.listdir(owners_dir):
+                shutil.rmtree(blob_dir, ignore_errors=True)
+                print(f"Freed shared artifacts {os.path.basename(blob_dir)}")
+        return True
+    
+    def detach(self, user_id: str, doc_id: str, doc_dir: str) -> bool:
+        """
+        Replace a shared link with a private copy of the shared set, so the
+        document's index can be modified without touching other owners.
+        Returns False if doc_dir is not shared.
+        """
+        if not os.path.islink(doc_dir):
+            return False
+        private_dir = f"{doc_dir}.detach"
+        shutil.rmtree(private_dir, ignore_errors=True)
+        with self._lock():
+            shutil.copytree(os.path.realpath(doc_dir), private_dir, ignore=shutil.ignore_patterns("owners"))
+        self.release(user_id, doc_id, doc_dir)
+        os.rename(private_dir, doc_dir)
+        return True
+    
+    def _link(self, blob_dir: str, user_id: str, doc_id: str, doc_dir: str):
+        owners_dir = os.path.join(blob_dir, "owners")
+        os.makedirs(owners_dir, exist_ok=True)
+        open(os.path.join(owners_dir, f"{user_id}.{doc_id}"), "w").close()
+        
+        os.makedirs(os.path.dirname(doc_dir), exist_ok=True)
+        if os.path.islink(doc_dir):
+            os.unlink(doc_dir)
+        # Relative link so API and worker containers can mount the volume anywhere
+        os.symlink(os.path.relpath(blob_dir, os.path.dirname(doc_dir)), doc_dir)
+    
+    def _blob_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+    
+    @contextmanager
+    def _lock(self):
+        """Serialize link/release across the API and worker processes"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+artifact_store = ArtifactStore(settings.FAISS_DATA_DIR)
@@ -0,0 +1,249 @@
+"""
+Embedding server
+One process per pod owns the embedding model and serves every API and
+worker process over a Unix socket, so the model is loaded once instead of
+once per process. Concurrent requests are gathered into micro-batches
+(at most EMBEDDING_SERVER_MAX_BATCH texts, waiting at most
+EMBEDDING_SERVER_MAX_WAIT_MS for more to arrive), and query texts are
+always batched ahead of queued ingestion texts.
+
+Usage: python -m app.services.embedding_server
+
+Wire format: every message is a 4-byte big-endian length and a payload.
+A request is one JSON message, {"priority": "query"|"ingest", "texts": [...]}
+or {"op": "stats"}; the reply is a JSON header ({"count", "dimension",
+"tokens"} or {"error"}) followed, on success, by one message of float32
+vectors.
+"""
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+PRIORITIES = ("query", "ingest")  # Batching order
+_LENGTH = struct.Struct(">I")
+
+
+class EmbeddingServerError(Exception):
+    """The embedding server is unreachable or failed a request"""
+
+
+class EmbeddingClient:
+    """Blocking client with one persistent connection per thread"""
+    
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+    
+    def embed(self, texts: List[str], priority: str = "query") -> Tuple[np.ndarray, int]:
+        """Vectors for texts, and the number of tokens the model processed"""
+        request = json.dumps({"priority": priority, "texts": texts}).encode("utf-8")
+        # A kept-alive connection may be stale after a server restart; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                _send_message(conn, request)
+                header = json.loads(_recv_message(conn))
+                if "error" in header:
+                    raise EmbeddingServerError(header["error"])
+                vectors = np.frombuffer(_recv_message(conn), dtype="float32")
+                return vectors.reshape(header["count"], header["dimension"]), header["tokens"]
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt:
+                    raise EmbeddingServerError(f"Embedding server at {self.socket_path} unavailable: {e}") from e
+    
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        _send_message(conn, json.dumps({"op": "stats"}).encode("utf-8"))
+        return json.loads(_recv_message(conn))
+    
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+    
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn.close()
+
+
+class MicroBatcher:
+    """
+    Gathers texts from concurrent requests into batches for one model
+    thread. A batch starts when the first text arrives and is closed after
+    max_wait seconds or at max_batch texts, taking query texts first.
+    """
+    
+    def __init__(self, encode: Callable[[List[str]], Tuple[np.ndarray, List[int]]], max_batch: int, max_wait: float):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queues = {priority: deque() for priority in PRIORITIES}
+        self.batches = 0
+        self.texts = 0
+        self.model_seconds = 0.0
+        self._arrived = asyncio.Event()
+        self._model_thread = ThreadPoolExecutor(1, thread_name_prefix="embedding-model")
+    
+    async def submit(self, texts: List[str], priority: str) -> Tuple[np.ndarray, int]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        self.queues[priority].extend(zip(texts, futures))
+        self._arrived.set()
+        results = await asyncio.gather(*futures)
+        vectors = np.stack([vector for vector, tokens in results]) if results else np.empty((0, 0), dtype="float32")
+        return vectors, sum(tokens for vector, tokens in results)
+    
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._arrived.wait()
+            self._arrived.clear()
+            if not self._pending():
+                continue
+            deadline = loop.time() + self.max_wait
+            while self._pending() < self.max_batch and loop.time() < deadline:
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                self._arrived.clear()
+            
+            batch = self._take()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                vectors, lengths = await loop.run_in_executor(self._model_thread, self.encode, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), vector, tokens in zip(batch, vectors, lengths):
+                    if not future.done():
+                        future.set_result((vector, tokens))
+            self.batches += 1
+            self.texts += len(batch)
+            self.model_seconds += time.perf_counter() - started
+            if self._pending():
+                self._arrived.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": {priority: len(queue) for priority, queue in self.queues.items()},
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else None,
+            "model_seconds": round(self.model_seconds, 3)
+        }
+    
+    def _pending(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+    
+    def _take(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = []
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue and len(batch) < self.max_batch:
+                text, future = queue.popleft()
+                if not future.cancelled():  # Requester disconnected
+                    batch.append((text, future))
+        return batch
+
+
+async def _handle(batcher: MicroBatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+            request = json.loads(await reader.readexactly(length))
+            
+            if request.get("op") == "stats":
+                writer.write(_frame(json.dumps(batcher.stats()).encode("utf-8")))
+            elif request.get("priority") not in PRIORITIES:
+                writer.write(_frame(json.dumps({"error": f"Unknown priority {request.get('priority')!r}"}).encode("utf-8")))
+            else:
+                try:
+                    vectors, tokens = await batcher.submit(request["texts"], request["priority"])
+                except Exception as e:
+                    writer.write(_frame(json.dumps({"error": f"Embedding failed: {e}"}).encode("utf-8")))
+                else:
+                    vectors = np.ascontiguousarray(vectors, dtype="float32")
+                    header = {"count": len(request["texts"]), "dimension": vectors.shape[1] if vectors.size else 0, "tokens": tokens}
+                    writer.write(_frame(json.dumps(header).encode("utf-8")))
+                    writer.write(_frame(vectors.tobytes()))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # Client closed the connection
+    finally:
+        writer.close()
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _send_message(conn: socket.socket, payload: bytes):
+    conn.sendall(_frame(payload))
+
+
+def _recv_message(conn: socket.socket) -> bytes:
+    (length,) = _LENGTH.unpack(_recv_exact(conn, _LENGTH.size))
+    return _recv_exact(conn, length)
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Embedding server closed the connection")
+        received += count
+    return bytes(buffer)
+
+
+async def serve(socket_path: str):
+    from app.services.vector import vector_service
+    
+    # This process owns the model; it must never route embeddings to itself
+    vector_service.embedding_client = None
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Left over from a previous run; clients wait for the new one
+    timings = vector_service.warm_up()
+    print(f"Embedding model resident: load {timings['model_load_seconds']:.1f}s ({settings.EMBEDDING_BACKEND} backend)")
+    
+    batcher = MicroBatcher(
+        vector_service.encode_batched,
+        settings.EMBEDDING_SERVER_MAX_BATCH,
+        settings.EMBEDDING_SERVER_MAX_WAIT_MS / 1000
+    )
+    server = await asyncio.start_unix_server(lambda r, w: _handle(batcher, r, w), path=socket_path)
+    os.chmod(socket_path, 0o666)
+    print(f"Embedding server listening on {socket_path}")
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run())
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(settings.EMBEDDING_SERVER_SOCKET))
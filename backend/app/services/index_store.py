@@ -0,0 +1,138 @@
+import fcntl
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from app.services.artifacts import ArtifactStore
+from app.services.metrics import percentile
+
+
+class IndexChecksumError(Exception):
+    """A fetched index file does not match the checksum it was published with"""
+
+
+class IndexDiskCache:
+    """
+    Size-bounded local disk cache of index files (FAISS and BM25) published
+    to object storage, for API nodes that do not share the worker's
+    FAISS_DATA_DIR. Files are named by their sha256, so a re-published index is a new entry
+    and a file is only renamed into place after its checksum is verified;
+    hits are served without re-hashing. A file's mtime is its last use, and
+    the least recently used files are removed once the directory grows past
+    max_bytes. Several processes can share the directory: fetches write to
+    private temporary names and eviction runs under a file lock. Evicting a
+    file another process has mapped is safe; the mapping keeps the inode.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.checksum_failures = 0
+        self.fetch_seconds = deque(maxlen=1000)  # Cold fetches: download and verify
+        self.fetched_bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, sha256: str, fetch: Callable[[str], None], suffix: str = ".faiss") -> str:
+        """Path of the cached file with this checksum, calling fetch(path) to download it on a miss"""
+        path = os.path.join(self.directory, f"{sha256}{suffix}")
+        try:
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+        
+        with self._lock:
+            self.misses += 1
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        started = time.perf_counter()
+        try:
+            # One retry: a torn download is far more likely than a bad upload
+            for attempt in range(2):
+                fetch(tmp_path)
+                if ArtifactStore.hash_file(tmp_path) == sha256:
+                    break
+                with self._lock:
+                    self.checksum_failures += 1
+                if attempt:
+                    raise IndexChecksumError(f"Fetched index does not match sha256 {sha256}")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        with self._lock:
+            self.fetch_seconds.append(time.perf_counter() - started)
+            self.fetched_bytes += os.path.getsize(path)
+        self._evict(keep=path)
+        return path
+    
+    def stats(self) -> Dict[str, Any]:
+        files = self._files()
+        with self._lock:
+            lookups = self.hits + self.misses
+            fetches = sorted(self.fetch_seconds)
+            return {
+                "files": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "checksum_failures": self.checksum_failures,
+                "fetched_bytes": self.fetched_bytes,
+                "cold_fetch_p50_seconds": percentile(fetches, 0.5),
+                "cold_fetch_p95_seconds": percentile(fetches, 0.95),
+                "cold_fetch_max_seconds": round(fetches[-1], 4) if fetches else None
+            }
+    
+    def _evict(self, keep: str):
+        with self._file_lock():
+            files = sorted(self._files(), key=lambda entry: entry[2])  # Oldest use first
+            total = sum(size for _, size, _ in files)
+            for path, size, _ in files:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue  # Larger than the whole cache; served once, evicted next time
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue  # Removed by another process
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+    
+    def _files(self) -> List[tuple]:
+        """(path, bytes, last use) of every cached file"""
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return files
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+    
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,152 @@
+"""
+BM25 lexical index
+One compact inverted index per document, built at ingestion next to the
+FAISS index and searched with it for hybrid retrieval. Postings are flat
+arrays grouped by term (CSR layout): offsets[t]:offsets[t + 1] slices the
+documents and term frequencies of term t. A posting's BM25 weight depends
+only on its term and document, so weights are computed once at load and a
+query is a few array slices added into one score array. "Documents" here
+are chunks, identified by their vector IDs.
+"""
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+# Words, numbers and dotted/apostrophised runs: "4.12", "poisson's", "x'"
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:['’.][^\W_]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Casefolded tokens; a trailing possessive 's is dropped so "Poisson's" matches "Poisson" """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.casefold()):
+        if token.endswith(("'s", "’s")):
+            token = token[:-2]
+        tokens.append(token)
+    return tokens
+
+
+class BM25Builder:
+    """Accumulates chunks batch by batch; build() sorts the postings once"""
+    
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.vector_ids: List[int] = []
+        self.doc_lengths: List[int] = []
+        self._postings: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []  # (term, doc, tf) per batch
+    
+    def add(self, vector_ids: Sequence[int], texts: Iterable[str]):
+        terms, docs, tfs = [], [], []
+        for vector_id, text in zip(vector_ids, texts):
+            doc = len(self.vector_ids)
+            counts = Counter(tokenize(text))
+            self.vector_ids.append(int(vector_id))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                terms.append(self.term_ids.setdefault(term, len(self.term_ids)))
+                docs.append(doc)
+                tfs.append(tf)
+        if terms:
+            self._postings.append((
+                np.asarray(terms, dtype=np.int32),
+                np.asarray(docs, dtype=np.int32),
+                np.asarray(tfs, dtype=np.uint16)
+            ))
+    
+    def build(self) -> "BM25Index":
+        terms = sorted(self.term_ids, key=self.term_ids.get)
+        if self._postings:
+            term_col, doc_col, tf_col = (np.concatenate(column) for column in zip(*self._postings))
+        else:
+            term_col, doc_col, tf_col = (np.empty(0, dtype=dtype) for dtype in (np.int32, np.int32, np.uint16))
+        order = np.argsort(term_col, kind="stable")  # Keeps each term's documents in order
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_col, minlength=len(terms)), out=offsets[1:])
+        return BM25Index(
+            np.asarray(terms, dtype=str),
+            offsets,
+            doc_col[order],
+            tf_col[order],
+            np.asarray(self.doc_lengths, dtype=np.int32),
+            np.asarray(self.vector_ids, dtype=np.int64)
+        )
+
+
+class BM25Index:
+    """Okapi BM25 over array-backed postings; see the module docstring for the layout"""
+    
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, postings: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, vector_ids: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.vector_ids = vector_ids
+        self.k1 = k1
+        self.b = b
+        self.term_ids = {term: i for i, term in enumerate(terms.tolist())}
+        count = len(doc_lengths)
+        mean_length = float(doc_lengths.mean()) if count else 0.0
+        doc_norms = k1 * (1 - b + b * doc_lengths / max(mean_length, 1e-9))
+        df = np.diff(offsets)
+        idf = np.log1p((count - df + 0.5) / (df + 0.5))
+        tf = tfs.astype(np.float32)
+        self.weights = (np.repeat(idf, df) * tf * (k1 + 1) / (tf + doc_norms[postings])).astype(np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.vector_ids)
+    
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.terms, self.offsets, self.postings, self.tfs, self.doc_lengths, self.vector_ids, self.weights)
+        return sum(array.nbytes for array in arrays)
+    
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """(vector_id, score) of the best matching chunks, best first"""
+        term_ids = {self.term_ids[token] for token in tokenize(query) if token in self.term_ids}
+        if not term_ids:
+            return []
+        scores = np.zeros(len(self.vector_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A document appears once per term, so plain fancy-index addition is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+        
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(self.vector_ids[doc]), float(scores[doc])) for doc in matched]
+    
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                terms=self.terms,
+                offsets=self.offsets,
+                postings=self.postings,
+                tfs=self.tfs,
+                doc_lengths=self.doc_lengths,
+                vector_ids=self.vector_ids
+            )
+    
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(k1=k1, b=b, **arrays)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Merge ranked (id, score) lists by summing 1 / (k + rank) per list. Only
+    ranks matter, so BM25 scores and L2 distances need no common scale.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (item, _) in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda entry: entry[1], reverse=True)
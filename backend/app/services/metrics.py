@@ -0,0 +1,8 @@
+from typing import List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank q-quantile (0-1) of ascending values, or None if there are none"""
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 4)
@@ -0,0 +1,139 @@
+import json
+import time
+from typing import Any, Dict, Optional
+
+import redis
+from redis import asyncio as aioredis
+
+from app.core.config import settings
+
+PROGRESS_TTL_SECONDS = 24 * 3600
+FINAL_STAGES = ("done", "error")
+
+redis_conn = redis.from_url(settings.REDIS_URL)
+
+
+def progress_key(doc_id: str) -> str:
+    return f"ingest:progress:{doc_id}"
+
+
+def get_progress(doc_id: str) -> Optional[Dict[str, Any]]:
+    """Latest progress snapshot published by the worker, if any"""
+    raw = redis_conn.get(progress_key(doc_id))
+    return json.loads(raw) if raw else None
+
+
+async def subscribe_progress(doc_id: str, heartbeat_seconds: float = 15.0):
+    """
+    Async generator of progress snapshots for SSE: the current snapshot
+    first, then every update the worker publishes until a final stage.
+    Yields None on heartbeat so the caller can keep the connection alive.
+    """
+    client = aioredis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    try:
+        # Subscribe before reading the snapshot so no update is missed in between
+        await pubsub.subscribe(progress_key(doc_id))
+        raw = await client.get(progress_key(doc_id))
+        if raw:
+            snapshot = json.loads(raw)
+            yield snapshot
+            if snapshot["stage"] in FINAL_STAGES:
+                return
+        
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat_seconds)
+            if message is None:
+                yield None
+                continue
+            snapshot = json.loads(message["data"])
+            yield snapshot
+            if snapshot["stage"] in FINAL_STAGES:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.close()
+        await client.close()
+
+
+class ProgressReporter:
+    """
+    Publishes an ingestion job's progress to Redis: the latest snapshot is
+    stored under a key for cheap polling and also sent on a pub/sub channel
+    of the same name for push-based streaming.
+    """
+    
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.stage = "queued"
+        self.pages_total = 0
+        self.pages_done = 0
+        self.chunks_embedded = 0
+        self._started_at = time.monotonic()
+        self._start_pages = 0
+        self._start_chunks = 0
+        self.error = None
+    
+    def start(self, pages_total: int, pages_done: int = 0, chunks_embedded: int = 0):
+        """Begin timing; pages/chunks already done (e.g. resumed) don't count toward throughput"""
+        self.pages_total = pages_total
+        self.pages_done = self._start_pages = pages_done
+        self.chunks_embedded = self._start_chunks = chunks_embedded
+        self._started_at = time.monotonic()
+        self.update("extracting")
+    
+    def update(self, stage: str, pages_done: int = None, chunks_embedded: int = None):
+        self.stage = stage
+        if pages_done is not None:
+            self.pages_done = pages_done
+        if chunks_embedded is not None:
+            self.chunks_embedded = chunks_embedded
+        self._publish()
+    
+    def finish(self, error: str = None, retrying: bool = False):
+        """
+        Publish the final stage. A failure that RQ will retry is published as
+        "retrying" instead, which is not final, so progress streams stay open
+        for the next attempt.
+        """
+        self.error = error
+        if error and retrying:
+            self.update("retrying")
+            return
+        self.update("error" if error else "done", pages_done=None if error else self.pages_total)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started_at
+        pages_rate = (self.pages_done - self._start_pages) / elapsed if elapsed > 0 else 0.0
+        chunks_rate = (self.chunks_embedded - self._start_chunks) / elapsed if elapsed > 0 else 0.0
+        pages_left = max(self.pages_total - self.pages_done, 0)
+        
+        # Chunk total is only known at the end; extrapolate from chunks per page so far
+        chunks_total = None
+        if self.pages_done and self.pages_total:
+            chunks_total = round(self.chunks_embedded / self.pages_done * self.pages_total)
+        
+        return {
+            "stage": self.stage,
+            "progress": self.pages_done / self.pages_total if self.pages_total else None,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_total_estimate": chunks_total,
+            "pages_per_second": round(pages_rate, 2),
+            "chunks_per_second": round(chunks_rate, 2),
+            "eta_seconds": round(pages_left / pages_rate, 1) if pages_rate > 0 else None,
+            "error": self.error,
+            "updated_at": time.time()
+        }
+    
+    def _publish(self):
+        payload = json.dumps(self.snapshot())
+        try:
+            pipe = redis_conn.pipeline()
+            pipe.set(progress_key(self.doc_id), payload, ex=PROGRESS_TTL_SECONDS)
+            pipe.publish(progress_key(self.doc_id), payload)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Progress is best-effort; never fail ingestion over it
+            print(f"Failed to publish progress for {self.doc_id}: {e}")
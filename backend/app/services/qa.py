@@ -1,8 +1,11 @@
 import re
+import time
 from typing import AsyncGenerator, Dict, Any
 from sqlalchemy.orm import Session
 import uuid
 
+from app.services.reranker import reranker
+from app.services.retrieval import retrieval_executor
 from app.services.vector import vector_service
 from app.models.document import Chunk
 from openai import AsyncOpenAI
@@ -22,14 +25,19 @@ class QAService:
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """Generate an answer with streaming and citations"""
         
+        started = time.perf_counter()
+        timing = {}
         try:
-            # 1. Retrieve relevant chunks
-            search_results = vector_service.search(
+            # 1. Retrieve relevant chunks (blocking; kept off the event loop).
+            # With the reranker on, a wider candidate set is retrieved for it to reorder.
+            search_results = await retrieval_executor.run(
+                vector_service.search,
                 user_id=user_id,
                 doc_id=document_id,
                 query=question,
-                top_k=8
+                top_k=settings.RERANK_CANDIDATES if settings.ENABLE_RERANKER else 8
             )
+            timing["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 1)
             
             if not search_results:
                 yield {
@@ -38,15 +46,18 @@ class QAService:
                 }
                 return
             
-            # 2. Get chunk details from database
+            # 2. Get chunk details from database, in retrieval order
+            rows = db.query(Chunk).filter(
+                Chunk.document_id == uuid.UUID(document_id),
+                Chunk.vector_id.in_([vector_id for vector_id, _ in search_results])
+            ).all()
+            rows_by_vector_id = {row.vector_id: row for row in rows}
             chunks = []
             for vector_id, score in search_results:
-                chunk = db.query(Chunk).filter(
-                    Chunk.document_id == uuid.UUID(document_id),
-                    Chunk.vector_id == vector_id
-                ).first()
+                chunk = rows_by_vector_id.get(vector_id)
                 if chunk:
                     chunks.append({
+                        "id": str(chunk.id),
                         "text": chunk.text,
                         "page_number": chunk.page_number,
                         "char_start": chunk.char_start,
@@ -54,6 +65,12 @@ class QAService:
                         "score": score
                     })
             
+            # 2b. Rerank with the cross-encoder; past the budget the retrieval order stands
+            if settings.ENABLE_RERANKER and chunks:
+                chunks, rerank_info = await reranker.rerank(question, chunks, settings.RERANK_BUDGET_MS)
+                timing["rerank_ms"] = rerank_info["ms"]
+                timing["rerank_status"] = rerank_info["status"]
+            
             # 3. Build evidence pack
             evidence = self._build_evidence_pack(chunks)
             
@@ -95,6 +112,8 @@ Provide a concise answer with citations."""
             async for chunk_response in stream:
                 if chunk_response.choices[0].delta.content:
                     token = chunk_response.choices[0].delta.content
+                    if not full_answer:
+                        timing["first_token_ms"] = round((time.perf_counter() - started) * 1000, 1)
                     full_answer += token
                     yield {
                         "type": "token",
@@ -108,6 +127,14 @@ Provide a concise answer with citations."""
                     "type": "citation",
                     "citation": citation
                 }
+            
+            # 7. Per-request timing, each stage reported separately
+            timing["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            print(f"QA timing for document {document_id}: {timing}")
+            yield {
+                "type": "timing",
+                "timing": timing
+            }
         
         except Exception as e:
             print(f"Error in QA service: {e}")
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.services.vector import normalize_query
+
+
+class Reranker:
+    """
+    Cross-encoder reranking of retrieved chunks. All uncached (query, chunk)
+    pairs of a request are scored in one batched predict call on a
+    dedicated model thread; scores are cached per (query hash, chunk id),
+    so a repeated question only scores chunks it has not seen. A request
+    waits at most its time budget: past it the caller keeps the retrieval
+    order. Scoring that has not started by then is cancelled; scoring
+    already running carries on and fills the cache for next time, and
+    requests arriving meanwhile skip reranking ("busy") instead of queueing
+    behind it, so work nobody waits for cannot pile up on the model thread.
+    The model loads on first use, or at startup through warm_up.
+    """
+    
+    def __init__(self, model_path: str, max_length: int, cache_entries: int):
+        self.model_path = model_path
+        self.max_length = max_length
+        self.cache_entries = cache_entries
+        self.model = None
+        self.cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.pool = ThreadPoolExecutor(1, thread_name_prefix="reranker")
+        self.abandoned: Set[Future] = set()  # Still scoring for requests that timed out
+        self.requests = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+    
+    def warm_up(self):
+        """Start loading the model on the model thread without waiting for it"""
+        self.pool.submit(self._ensure_model_loaded)
+    
+    async def rerank(self, query: str, chunks: List[Dict[str, Any]],
+                     budget_ms: float) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Order chunk dicts (with "id" and "text") by cross-encoder score,
+        best first, and add a "rerank_score" to each. Returns the chunks
+        and timing info; on timeout, or while the model thread is still
+        busy with a timed-out request, the chunks come back in their
+        original order with "status": "timeout" or "busy".
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            if self.abandoned:
+                self.skipped += 1
+                return chunks, {"status": "busy", "ms": 0.0}
+        future = self.pool.submit(self.score, query, [(chunk["id"], chunk["text"]) for chunk in chunks])
+        try:
+            scores = await asyncio.wait_for(asyncio.wrap_future(future), budget_ms / 1000)
+        except asyncio.TimeoutError:
+            if not future.cancel():  # Already running: it cannot be stopped
+                with self._lock:
+                    self.abandoned.add(future)
+                future.add_done_callback(self._release)
+            with self._lock:
+                self.timeouts += 1
+            return chunks, {"status": "timeout", "ms": round((time.perf_counter() - started) * 1000, 1)}
+        
+        for chunk, score in zip(chunks, scores):
+            chunk["rerank_score"] = score
+        ranked = sorted(chunks, key=lambda chunk: chunk["rerank_score"], reverse=True)
+        return ranked, {"status": "applied", "ms": round((time.perf_counter() - started) * 1000, 1)}
+    
+    def score(self, query: str, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        """Cross-encoder scores for (chunk id, text) pairs against query, in order"""
+        query_hash = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        keys = [(query_hash, chunk_id) for chunk_id, _ in pairs]
+        scores: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                score = self.cache.get(key)
+                if score is not None:
+                    self.cache.move_to_end(key)
+                scores.append(score)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        with self._lock:
+            self.cache_hits += len(pairs) - len(missing)
+        if not missing:
+            return scores
+        
+        self._ensure_model_loaded()
+        predicted = self.model.predict(
+            [(query, pairs[i][1]) for i in missing],
+            batch_size=len(missing),
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        with self._lock:
+            self.pairs_scored += len(missing)
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                self.cache[keys[i]] = scores[i]
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+        return scores
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "model_loaded": self.model is not None,
+                "requests": self.requests,
+                "timeouts": self.timeouts,
+                "skipped_busy": self.skipped,
+                "pairs_scored": self.pairs_scored,
+                "cache_hits": self.cache_hits,
+                "cache_entries": len(self.cache)
+            }
+    
+    def _release(self, future: Future):
+        with self._lock:
+            self.abandoned.discard(future)
+    
+    def _ensure_model_loaded(self):
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            print(f"Loading reranker model: {self.model_path}")
+            self.model = CrossEncoder(self.model_path, max_length=self.max_length)
+
+
+reranker = Reranker(settings.BGE_RERANKER_MODEL_PATH, settings.RERANK_MAX_LENGTH, settings.RERANK_CACHE_MAX_ENTRIES)
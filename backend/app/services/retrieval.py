@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.core.config import settings
+from app.services.metrics import percentile
+
+
+class RetrievalBusy(Exception):
+    """Raised when the retrieval queue is full"""
+
+
+class RetrievalExecutor:
+    """
+    Runs blocking retrieval (index load, query embedding, FAISS search) on
+    a dedicated thread pool so it never stalls the event loop that streams
+    other users' answers. At most max_workers retrievals run at once and at
+    most max_queue wait; past that callers get RetrievalBusy instead of an
+    ever-growing backlog. With max_workers=0 retrieval runs inline on the
+    event loop, as it did before.
+    """
+    
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(max_workers, thread_name_prefix="retrieval") if max_workers > 0 else None
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = deque(maxlen=1000)  # Time queued before a thread picked the call up
+        self.run_seconds = deque(maxlen=1000)
+        self._lock = threading.Lock()
+    
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if self.pool is None:
+            return self._timed(fn, args, kwargs)
+        
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise RetrievalBusy("Too many questions in progress; please try again shortly.")
+            self.queued += 1
+        submitted = time.perf_counter()
+        
+        def task():
+            with self._lock:
+                self.queued -= 1
+                self.wait_seconds.append(time.perf_counter() - submitted)
+            return self._timed(fn, args, kwargs)
+        
+        future = self.pool.submit(task)
+        # A request cancelled while queued (client gone) never runs task()
+        future.add_done_callback(lambda done: done.cancelled() and self._dequeue_cancelled())
+        return await asyncio.wrap_future(future)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self.wait_seconds)
+            runs = sorted(self.run_seconds)
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_p50_seconds": percentile(waits, 0.5),
+                "wait_p95_seconds": percentile(waits, 0.95),
+                "run_p50_seconds": percentile(runs, 0.5),
+                "run_p95_seconds": percentile(runs, 0.95)
+            }
+    
+    def _timed(self, fn: Callable[..., Any], args, kwargs) -> Any:
+        with self._lock:
+            self.running += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.run_seconds.append(time.perf_counter() - started)
+    
+    def _dequeue_cancelled(self):
+        with self._lock:
+            self.queued -= 1
+
+
+retrieval_executor = RetrievalExecutor(settings.RETRIEVAL_MAX_CONCURRENCY, settings.RETRIEVAL_MAX_QUEUE)
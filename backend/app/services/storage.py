@@ -1,20 +1,68 @@
+import mmap
+from typing import Callable, Optional
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
 from app.core.config import settings
 
+MB = 1024 * 1024
+
+
+class BufferWriter:
+    """
+    Seekable write-only file object over a preallocated buffer, so boto3's
+    threaded part downloads land directly in place with no intermediate copy
+    """
+    
+    def __init__(self, buffer):
+        self.view = memoryview(buffer)
+        self.position = 0
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self.position, 2: len(self.view)}[whence]
+        self.position = base + offset
+        return self.position
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def write(self, data) -> int:
+        size = len(data)
+        self.view[self.position:self.position + size] = data
+        self.position += size
+        return size
+    
+    def close(self):
+        self.view.release()
+
 
 class StorageService:
     def __init__(self):
-        # Internal client for API operations (uses Docker network hostname)
+        # Internal client for API operations (uses Docker network hostname).
+        # The pool is sized for parallel part downloads and reused across calls.
         self.client = boto3.client(
             's3',
             endpoint_url=f"{'https' if settings.MINIO_SECURE else 'http'}://{settings.MINIO_ENDPOINT}",
             aws_access_key_id=settings.MINIO_ACCESS_KEY,
             aws_secret_access_key=settings.MINIO_SECRET_KEY,
-            config=Config(signature_version='s3v4'),
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=max(10, settings.STORAGE_DOWNLOAD_THREADS * 2),
+                tcp_keepalive=True
+            ),
             region_name='us-east-1'
         )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.STORAGE_PART_SIZE_MB * MB,
+            multipart_chunksize=settings.STORAGE_PART_SIZE_MB * MB,
+            max_concurrency=settings.STORAGE_DOWNLOAD_THREADS,
+            use_threads=True
+        )
         # External client for presigned URLs (uses localhost for browser access)
         external_endpoint = settings.MINIO_ENDPOINT.replace('minio', 'localhost')
         self.external_client = boto3.client(
@@ -67,11 +115,43 @@ class StorageService:
         return url
     
     def download_file(self, object_key: str, local_path: str):
-        self.client.download_file(self.bucket, object_key, local_path)
+        self.client.download_file(self.bucket, object_key, local_path, Config=self.transfer_config)
+    
+    def download_to_buffer(self, object_key: str, allocate: Callable[[int], object] = None):
+        """
+        Download an object into memory with parallel ranged part requests.
+        `allocate(size)` returns the writable buffer to fill (an anonymous
+        mmap by default, which is returned to the OS as soon as it is closed).
+        """
+        size = self.get_object_size(object_key)
+        buffer = allocate(size) if allocate else mmap.mmap(-1, max(size, 1))
+        writer = BufferWriter(buffer)
+        try:
+            self.client.download_fileobj(self.bucket, object_key, writer, Config=self.transfer_config)
+        finally:
+            writer.close()
+        return buffer
+    
+    def get_object_size(self, object_key: str) -> int:
+        response = self.client.head_object(Bucket=self.bucket, Key=object_key)
+        return response['ContentLength']
+    
+    def read_object(self, object_key: str) -> Optional[bytes]:
+        """A small object's bytes, or None if it does not exist"""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=object_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
     
     def upload_file(self, local_path: str, object_key: str):
         self.client.upload_file(local_path, self.bucket, object_key)
     
+    def upload_bytes(self, data: bytes, object_key: str, content_type: str = 'application/octet-stream'):
+        self.client.put_object(Bucket=self.bucket, Key=object_key, Body=data, ContentType=content_type)
+    
     def delete_object(self, object_key: str):
         self.client.delete_object(Bucket=self.bucket, Key=object_key)
     
@@ -1,72 +1,941 @@
+import fcntl
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
 import faiss
-from typing import List, Tuple
+import redis
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 from sentence_transformers import SentenceTransformer
 
 from app.core.config import settings
+from app.services.artifacts import artifact_store
+from app.services.embedding_server import EmbeddingClient
+from app.services.index_store import IndexDiskCache
+from app.services.lexical import BM25Builder, BM25Index, reciprocal_rank_fusion
+
+
+INDEX_TYPES = ("flat", "hnsw_flat", "hnsw_sq8", "hnsw_fp16", "ivf_pq")
+# INDEX_TYPE=auto: (max vectors, M, efConstruction) for HNSW above the flat limit
+HNSW_SIZE_TIERS = ((50000, 16, 64), (500000, 32, 128), (float("inf"), 48, 200))
+EF_SEARCH_CANDIDATES = (16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512)
+CALIBRATION_QUERIES = 200
+CALIBRATION_K = 10
+# Each PQ sub-quantizer learns 256 centroids and FAISS wants ~39 training
+# points per centroid; smaller documents get hnsw_sq8 instead
+IVF_PQ_MIN_VECTORS = 39 * 256
+TRAIN_SAMPLE_MAX = 65536
+
+
+def staged_vectors(staging: faiss.Index) -> np.ndarray:
+    """Zero-copy (ntotal, d) view of the vectors in a flat staging index"""
+    if staging.ntotal == 0:
+        return np.empty((0, staging.d), dtype='float32')
+    return faiss.rev_swig_ptr(staging.get_xb(), staging.ntotal * staging.d).reshape(staging.ntotal, staging.d)
+
+
+def choose_index(count: int) -> Tuple[str, int, int]:
+    """Index type, HNSW M and efConstruction that INDEX_TYPE=auto uses for count vectors"""
+    if count <= settings.INDEX_FLAT_MAX_VECTORS:
+        return "flat", 0, 0
+    for max_count, m, ef_construction in HNSW_SIZE_TIERS:
+        if count <= max_count:
+            return "hnsw_flat", m, ef_construction
+
+
+class LoadedIndex(NamedTuple):
+    index: faiss.Index
+    meta: Dict[str, Any]  # Contents of index.json: type and build/search parameters
+    deleted: Optional[faiss.IDSelector] = None  # Excludes tombstoned vector IDs from HNSW and IVF search
+    # index.json mtime, or for a published index fetched from object storage
+    # its (FAISS, BM25) checksums; compared to notice rewrites by other processes
+    version: Optional[Any] = None
+    lexical: Optional[BM25Index] = None  # BM25 index of the same chunks, for hybrid search
+
+
+# Whether this FAISS build can map every index type, not only IVF lists
+MMAP_ALL_INDEX_TYPES = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+
+def read_index_file(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    Read a FAISS index. With mmap the vectors and graph stay in the file's
+    read-only mapping, so every process serving the index shares one copy
+    in the page cache and loading costs no copy; the index must not be
+    modified.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    # IO_FLAG_MMAP_IFC maps flat codes and HNSW graphs; older FAISS builds,
+    # including the pinned faiss-cpu 1.7.4, only have IO_FLAG_MMAP, which maps
+    # IVF inverted lists, so flat and HNSW indexes are still copied into memory
+    flags = (faiss.IO_FLAG_MMAP_IFC if MMAP_ALL_INDEX_TYPES else faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    return faiss.read_index(path, flags)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by sha256(model, normalize flag, text).
+    Vectors are stored in a float16 memmap; parallel memmaps hold each
+    slot's key hash and last-used time, and the least recently used slots
+    are evicted in bulk when the cache is full. Writers take an exclusive
+    file lock and readers a shared one, so several worker processes can
+    share one cache directory.
+    """
+    
+    def __init__(self, directory: str, dimension: int, max_bytes: int, evict_fraction: float = 0.1):
+        self.directory = directory
+        self.dimension = dimension
+        self.capacity = max(1, max_bytes // (dimension * 2))
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None  # Opened lazily on first use
+    
+    @staticmethod
+    def make_key(namespace: str, text: str) -> bytes:
+        return hashlib.sha256(namespace.encode() + b"\0" + text.encode("utf-8")).digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[int, np.ndarray]:
+        """Return {position: vector} for the keys that are cached"""
+        self._open()
+        now = time.time()
+        found = {}
+        # Shared lock: a writer in another process cannot evict and refill a
+        # slot between its key check and the vector copy
+        with self._lock(fcntl.LOCK_SH):
+            for position, key in enumerate(keys):
+                slot = self._slots.get(key)
+                # Another process may have evicted and reused the slot
+                if slot is not None and self._keys[slot].tobytes() == key:
+                    found[position] = np.asarray(self._vectors[slot], dtype="float32")
+                    self._stamps[slot] = now
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+    
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        self._open()
+        with self._lock():
+            self._refresh_slots()
+            new = {key: vector for key, vector in zip(keys, vectors) if key not in self._slots}
+            new = list(new.items())[:self.capacity]
+            if not new:
+                return
+            
+            free = np.flatnonzero(~self._keys.any(axis=1))
+            if len(free) < len(new):
+                free = np.concatenate([free, self._evict(len(new) - len(free))])
+            
+            now = time.time()
+            for (key, vector), slot in zip(new, free):
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype="uint8")
+                self._stamps[slot] = now
+                self._slots[key] = int(slot)
+            for array in (self._vectors, self._keys, self._stamps):
+                array.flush()
+    
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def _evict(self, needed: int) -> np.ndarray:
+        """Free at least `needed` least recently used slots and return them"""
+        count = min(self.capacity, max(needed, int(self.capacity * self.evict_fraction)))
+        used = np.flatnonzero(self._keys.any(axis=1))
+        oldest = used[np.argpartition(self._stamps[used], count - 1)[:count]] if count < len(used) else used
+        for slot in oldest:
+            self._slots.pop(self._keys[slot].tobytes(), None)
+        self._keys[oldest] = 0
+        return oldest
+    
+    def _open(self):
+        if self._vectors is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        meta = {"dimension": self.dimension, "capacity": self.capacity}
+        meta_path = os.path.join(self.directory, "meta.json")
+        # Checked under the lock: two processes that both found no cache
+        # would otherwise each create one, the second truncating the first's
+        with self._lock():
+            try:
+                with open(meta_path) as f:
+                    mode = "r+" if json.load(f) == meta else "w+"
+            except (OSError, ValueError):
+                mode = "w+"
+            self._vectors = self._memmap("vectors.f16", "float16", (self.capacity, self.dimension), mode)
+            self._keys = self._memmap("keys.bin", "uint8", (self.capacity, 32), mode)
+            self._stamps = self._memmap("stamps.f64", "float64", (self.capacity,), mode)
+            if mode == "w+":
+                # Written last so a half-created cache is recreated next time
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f)
+            self._refresh_slots()
+    
+    def _memmap(self, filename: str, dtype: str, shape: tuple, mode: str) -> np.memmap:
+        return np.memmap(os.path.join(self.directory, filename), dtype=dtype, mode=mode, shape=shape)
+    
+    def _refresh_slots(self):
+        used = np.flatnonzero(self._keys.any(axis=1))
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in used}
+    
+    @contextmanager
+    def _lock(self, mode: int = fcntl.LOCK_EX):
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+EMBEDDING_BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+class TorchEmbeddingBackend:
+    """The sentence-transformers model, optionally with Linear layers dynamically quantized to int8"""
+    
+    def __init__(self, model_path: str, quantize: bool = False, threads: int = 0):
+        import torch
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_path)
+        if quantize:
+            torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+
+class OnnxEmbeddingBackend:
+    """
+    The transformer exported by scripts/export_onnx.py, run with ONNX
+    Runtime. Pooling and max sequence length come from the
+    embedding.json written at export, matching the sentence-transformers
+    model they were taken from.
+    """
+    
+    def __init__(self, model_dir: str, threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        
+        with open(os.path.join(model_dir, "embedding.json")) as f:
+            config = json.load(f)
+        self.pooling = config["pooling"]
+        self.max_seq_length = config["max_seq_length"]
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, config.get("model_file", "model.onnx")),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            batches.append(np.ascontiguousarray(pooled, dtype="float32"))
+        if not batches:
+            return np.empty((0, 0), dtype="float32")
+        embeddings = np.concatenate(batches)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+
+def load_embedding_backend(backend: str):
+    threads = settings.EMBEDDING_THREADS
+    if backend == "torch":
+        return TorchEmbeddingBackend(settings.BGE_M3_MODEL_PATH, threads=threads)
+    if backend == "torch_int8":
+        return TorchEmbeddingBackend(settings.BGE_M3_MODEL_PATH, quantize=True, threads=threads)
+    if backend == "onnx":
+        return OnnxEmbeddingBackend(settings.EMBEDDING_ONNX_DIR, threads=threads)
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+
+
+def token_budget_batches(order: Sequence[int], lengths: Sequence[int], max_tokens: int,
+                         max_batch_size: int) -> Iterator[List[int]]:
+    """
+    Split indices, given longest first, into batches whose padded size
+    (count x longest) stays within max_tokens. A text longer than the
+    budget gets a batch of its own.
+    """
+    batch: List[int] = []
+    for i in order:
+        # The batch's first index is its longest, so it sets the padded length
+        if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * lengths[batch[0]] > max_tokens):
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+
+def embedding_namespace() -> str:
+    """
+    Identifies the vectors the configured model and backend produce;
+    embedding cache keys and the ingestion dedup fingerprint include it.
+    """
+    namespace = f"{settings.BGE_M3_MODEL_PATH}|normalize=True"
+    if settings.EMBEDDING_BACKEND == "torch_int8":
+        namespace += "|torch_int8"
+    elif settings.EMBEDDING_BACKEND == "onnx":
+        namespace += f"|onnx:{settings.EMBEDDING_ONNX_DIR}"
+    return namespace
+
+
+def normalize_query(text: str) -> str:
+    """Collapse whitespace and fold case, so trivially different questions share an embedding"""
+    return " ".join(text.split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    In-process LRU cache of query embeddings with a TTL, keyed by
+    normalized query text. With a Redis client, misses fall through to a
+    shared tier so API processes reuse each other's embeddings; Redis
+    errors only cost the model call.
+    """
+    
+    def __init__(self, namespace: str, max_entries: int, ttl_seconds: int, redis_client=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self._key(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]  # Expired
+        
+        vector = self._redis_get(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.redis_hits += 1
+        self._put_local(key, vector)
+        return vector
+    
+    def put(self, text: str, vector: np.ndarray):
+        key = self._key(text)
+        vector = np.array(vector, dtype="float32")
+        vector.setflags(write=False)  # Shared by every caller that hits it
+        self._put_local(key, vector)
+        if self.redis is not None:
+            try:
+                self.redis.set(f"query_embedding:{key}", vector.tobytes(), ex=self.ttl_seconds)
+            except redis.RedisError as e:
+                print(f"Query embedding cache write failed: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.redis_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.redis_hits) / lookups if lookups else 0.0
+            }
+    
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+    
+    def _put_local(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self.entries[key] = (vector, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def _redis_get(self, key: str) -> Optional[np.ndarray]:
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(f"query_embedding:{key}")
+        except redis.RedisError as e:
+            print(f"Query embedding cache read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        return np.frombuffer(raw, dtype="float32")  # Read-only, like local entries
+
+
+class IndexCache:
+    """
+    LRU cache of loaded FAISS indexes bounded by total bytes rather than
+    count. Loads are single-flight: concurrent requests for an index that
+    is not resident wait for one loader instead of each reading the file.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Tuple[LoadedIndex, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Event] = {}
+    
+    def get_or_load(self, key: str, loader: Callable[[], Optional[Tuple[LoadedIndex, int]]]) -> Optional[LoadedIndex]:
+        """Return the cached index for key, calling loader() -> (index, nbytes) on a miss"""
+        while True:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                pending = self._loading.get(key)
+                if pending is None:
+                    self.misses += 1
+                    pending = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this index; wait, then re-check
+            pending.wait()
+        
+        try:
+            loaded = loader()
+            if loaded is not None:
+                self._put(key, *loaded)
+            return loaded[0] if loaded is not None else None
+        finally:
+            with self._lock:
+                del self._loading[key]
+            pending.set()
+    
+    def invalidate(self, key: str):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+    
+    def _put(self, key: str, index: LoadedIndex, nbytes: int):
+        with self._lock:
+            if nbytes > self.max_bytes:
+                return  # Served once but never resident
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            while self.entries and self.total_bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+            self.entries[key] = (index, nbytes)
+            self.total_bytes += nbytes
 
 
 class VectorService:
     def __init__(self):
         self.model = None
+        self.tokenizer = None
+        # With the embedding server, this process never loads the model
+        self.embedding_client: Optional[EmbeddingClient] = None
+        if settings.EMBEDDING_SERVER_ENABLED:
+            self.embedding_client = EmbeddingClient(
+                settings.EMBEDDING_SERVER_SOCKET,
+                settings.EMBEDDING_SERVER_TIMEOUT_SECONDS
+            )
         self.dimension = 1024  # BGE-M3 dimension
-        self.indexes = {}  # Cache for loaded indexes
+        self.index_cache = IndexCache(settings.INDEX_CACHE_MAX_MB * 1024 * 1024)
+        if settings.INDEX_MMAP and not MMAP_ALL_INDEX_TYPES:
+            print(f"Warning: INDEX_MMAP only maps IVF indexes with FAISS {faiss.__version__}; "
+                  f"flat and HNSW indexes are loaded into process memory")
+        # Indexes not on the local volume are fetched from object storage into this
+        self.disk_cache: Optional[IndexDiskCache] = None
+        if settings.INDEX_REMOTE_ENABLED:
+            self.disk_cache = IndexDiskCache(
+                settings.INDEX_DISK_CACHE_DIR,
+                settings.INDEX_DISK_CACHE_MAX_MB * 1024 * 1024
+            )
+        self._remote_checked: Dict[str, float] = {}  # Last index.json check per published index
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                settings.EMBEDDING_CACHE_DIR,
+                self.dimension,
+                settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+            )
+        # Ingestion embedding throughput, cumulative for the process
+        self.embedded_chunks = 0
+        self.embedded_tokens = 0
+        self.embedding_seconds = 0.0
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        if settings.QUERY_CACHE_ENABLED:
+            self.query_cache = QueryEmbeddingCache(
+                embedding_namespace(),
+                settings.QUERY_CACHE_MAX_ENTRIES,
+                settings.QUERY_CACHE_TTL_SECONDS,
+                redis.from_url(settings.REDIS_URL) if settings.QUERY_CACHE_REDIS else None
+            )
     
     def _ensure_model_loaded(self):
         if self.model is None:
-            print(f"Loading BGE-M3 model: {settings.BGE_M3_MODEL_PATH}")
-            self.model = SentenceTransformer(settings.BGE_M3_MODEL_PATH)
-            # Optimize for int8 quantization if possible
-            # For now, we'll use FP32 and quantize later if needed
+            print(f"Loading BGE-M3 model: {settings.BGE_M3_MODEL_PATH} ({settings.EMBEDDING_BACKEND} backend)")
+            self.model = load_embedding_backend(settings.EMBEDDING_BACKEND)
+    
+    def warm_up(self) -> Dict[str, float]:
+        """Load the model (unless served remotely) and run one embedding; returns the time each step took"""
+        started = time.perf_counter()
+        if self.embedding_client is None:
+            self._ensure_model_loaded()
+        loaded = time.perf_counter()
+        self.embed_texts(["warm-up"])
+        embedded = time.perf_counter()
+        return {
+            "model_load_seconds": round(loaded - started, 3),
+            "first_embedding_seconds": round(embedded - loaded, 3)
+        }
+    
+    def get_tokenizer(self):
+        """The embedding model's tokenizer, e.g. for token-budgeted chunking"""
+        if self.embedding_client is None:
+            self._ensure_model_loaded()
+            return self.model.tokenizer
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            source = settings.EMBEDDING_ONNX_DIR if settings.EMBEDDING_BACKEND == "onnx" else settings.BGE_M3_MODEL_PATH
+            self.tokenizer = AutoTokenizer.from_pretrained(source)
+        return self.tokenizer
     
     def embed_texts(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of texts"""
+        """Generate embeddings for a list of texts (query priority on the embedding server)"""
+        if self.embedding_client is not None:
+            return self.embedding_client.embed(texts, "query")[0]
         self._ensure_model_loaded()
-        embeddings = self.model.encode(texts, normalize_embeddings=True)
+        embeddings = self.model.encode(texts)
         return embeddings
     
-    def create_index(self, user_id: str, doc_id: str, texts: List[str]) -> Tuple[faiss.Index, List[int]]:
-        """Create a FAISS index for document chunks"""
-        embeddings = self.embed_texts(texts)
+    def embed_batched(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed ingestion texts in length-bucketed batches (see
+        encode_batched), on the embedding server when there is one
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype="float32")
+        started = time.perf_counter()
+        if self.embedding_client is not None:
+            embeddings, tokens = self.embedding_client.embed(texts, "ingest")
+        else:
+            embeddings, lengths = self.encode_batched(texts)
+            tokens = sum(lengths)
+        
+        self.embedded_chunks += len(texts)
+        self.embedded_tokens += tokens
+        self.embedding_seconds += time.perf_counter() - started
+        return embeddings
+    
+    def encode_batched(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Embed texts with the in-process model: sorted by token count, cut
+        where the padded batch would exceed EMBEDDING_BATCH_TOKENS, and
+        returned in input order with each text's token count. Short
+        headings then share large batches instead of being padded to the
+        length of a dense paragraph.
+        """
+        self._ensure_model_loaded()
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+        lengths = self.token_lengths(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        for batch in token_budget_batches(order, lengths, settings.EMBEDDING_BATCH_TOKENS,
+                                          settings.EMBEDDING_MAX_BATCH_SIZE):
+            embeddings[batch] = self.model.encode([texts[i] for i in batch], batch_size=len(batch))
+        return embeddings, lengths
+    
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Token counts as the model sees them, special tokens included and truncated to its max length"""
+        self._ensure_model_loaded()
+        if not texts:
+            return []
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+    
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed chunk texts, sending only embedding cache misses to the model"""
+        if self.embedding_cache is None:
+            return self.embed_batched(texts)
+        
+        namespace = embedding_namespace()
+        keys = [EmbeddingCache.make_key(namespace, text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
         
-        # Create HNSW index for efficient similarity search
-        index = faiss.IndexHNSWFlat(self.dimension, 32)
-        index.hnsw.efConstruction = 40
-        index.hnsw.efSearch = 16
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+        for position, vector in cached.items():
+            embeddings[position] = vector
         
-        # Add vectors
-        index.add(embeddings.astype('float32'))
+        misses = [position for position in range(len(texts)) if position not in cached]
+        if misses:
+            fresh = self.embed_batched([texts[position] for position in misses])
+            embeddings[misses] = fresh
+            self.embedding_cache.put_many([keys[position] for position in misses], fresh)
+        return embeddings
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a search query as typed; the model is cased. The cache is keyed
+        by the normalized text, so variants of a question that differ only
+        in case or spacing share the vector of whichever was embedded first.
+        """
+        if self.query_cache is None:
+            return self.embed_texts([query])[0]
+        vector = self.query_cache.get(query)
+        if vector is None:
+            vector = self.embed_texts([query])[0]
+            self.query_cache.put(query, vector)
+        return vector
+    
+    def new_index(self) -> faiss.Index:
+        """
+        Create an empty exact index that ingestion batches are appended to.
+        Quantized types need their training data up front, so vectors are
+        staged here and save_index builds the configured type from them.
+        """
+        return faiss.IndexFlatL2(self.dimension)
+    
+    def add_embeddings(self, index: faiss.Index, embeddings: np.ndarray) -> List[int]:
+        """Append a batch of embeddings to an index and return their vector IDs"""
+        start = index.ntotal
+        index.add(np.ascontiguousarray(embeddings, dtype='float32'))
+        return list(range(start, index.ntotal))
+    
+    def build_index(self, embeddings: np.ndarray, index_type: Optional[str] = None,
+                    ids: Optional[np.ndarray] = None) -> Tuple[faiss.Index, Dict[str, Any]]:
+        """
+        Build a searchable index of the given type (default INDEX_TYPE) over
+        embeddings, wrapped in an ID map so vector IDs (default: row
+        positions) survive appends, removals and compaction. Returns the
+        index and its metadata, which records the type actually built and
+        its parameters, including the efSearch profile HNSW search uses to
+        meet its budget.
+        """
+        requested = index_type or settings.INDEX_TYPE
+        if requested not in INDEX_TYPES and requested != "auto":
+            raise ValueError(f"Unknown index type {requested!r}; expected auto or one of {', '.join(INDEX_TYPES)}")
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        count = len(embeddings)
+        ids = np.arange(count, dtype='int64') if ids is None else np.ascontiguousarray(ids, dtype='int64')
+        
+        index_type, m, ef_construction = requested, settings.INDEX_HNSW_M, settings.INDEX_EF_CONSTRUCTION
+        if requested == "auto":
+            index_type, m, ef_construction = choose_index(count)
+        if count == 0:
+            index_type = "flat"  # Nothing to train quantizers on
+        elif index_type == "ivf_pq" and count < IVF_PQ_MIN_VECTORS:
+            index_type = "hnsw_sq8"  # Too few vectors to train product quantizers
+        
+        params: Dict[str, Any] = {}
+        if index_type == "flat":
+            index = faiss.IndexFlatL2(self.dimension)
+        elif index_type == "ivf_pq":
+            nlist = max(1, min(int(4 * np.sqrt(count)), count // 39))
+            index = faiss.IndexIVFPQ(faiss.IndexFlatL2(self.dimension), self.dimension, nlist, settings.INDEX_PQ_M, 8)
+            index.nprobe = min(settings.INDEX_IVF_NPROBE, nlist)
+            params = {"nlist": nlist, "pq_m": settings.INDEX_PQ_M, "nprobe": index.nprobe}
+        else:
+            if index_type == "hnsw_flat":
+                index = faiss.IndexHNSWFlat(self.dimension, m)
+            else:
+                qtype = faiss.ScalarQuantizer.QT_8bit if index_type == "hnsw_sq8" else faiss.ScalarQuantizer.QT_fp16
+                index = faiss.IndexHNSWSQ(self.dimension, qtype, m)
+            index.hnsw.efConstruction = ef_construction
+            params = {"m": m, "ef_construction": ef_construction}
+        
+        if not index.is_trained:
+            index.train(self._training_sample(embeddings))
+        mapped = faiss.IndexIDMap2(index)
+        mapped.add_with_ids(embeddings, ids)
         
-        # Save index
+        if index_type.startswith("hnsw"):
+            # Calibrated on the inner index, whose labels are row positions like the exact neighbours
+            profile = self._calibrate_ef_search(index, embeddings)
+            index.hnsw.efSearch = profile[-1][0]
+            params.update(ef_search=index.hnsw.efSearch, ef_profile=profile)
+        
+        meta = {
+            "type": index_type,
+            "requested": requested,
+            "target_recall": settings.INDEX_TARGET_RECALL,
+            "dimension": self.dimension,
+            "ntotal": mapped.ntotal,
+            "id_mapped": True,
+            "next_id": int(ids.max()) + 1 if count else 0,
+            "tombstones": [],
+            "params": params
+        }
+        return mapped, meta
+    
+    def update_index(self, user_id: str, doc_id: str, embeddings: np.ndarray, remove_ids: Sequence[int] = (),
+                     lexical: Optional[BM25Builder] = None,
+                     texts: Sequence[str] = ()) -> Tuple[List[int], Dict[str, Any]]:
+        """
+        Remove vector IDs from a document's index and append new vectors
+        without rebuilding it. Returns the new vectors' IDs, which continue
+        after every ID the index has ever assigned, and the new metadata.
+        Flat indexes drop removed vectors outright. HNSW graphs cannot, and
+        IVF lists keep their positions after a removal while the ID map
+        assumes they shift, so for both the IDs are tombstoned (filtered
+        from search) until compact_index rebuilds the index. lexical, if
+        given, holds every other surviving chunk; the new vectors' texts are
+        added to it under their IDs and it replaces the BM25 index.
+        """
+        with self._update_lock(user_id, doc_id):
+            index, meta = self._open_for_update(user_id, doc_id)
+            self._remove_vectors(index, meta, remove_ids)
+            new_ids = self._append_vectors(index, meta, embeddings)
+            if lexical is not None:
+                lexical.add(new_ids, texts)
+            meta = self.write_index(user_id, doc_id, index, meta, lexical.build() if lexical is not None else None)
+        return new_ids, meta
+    
+    def needs_compaction(self, meta: Dict[str, Any]) -> bool:
+        """Too many tombstones, or enough growth that INDEX_TYPE=auto would now build another type"""
+        if len(meta.get("tombstones", ())) >= settings.INDEX_COMPACT_TOMBSTONE_RATIO * max(meta["ntotal"], 1):
+            return True
+        live = meta["ntotal"] - len(meta.get("tombstones", ()))
+        return meta.get("requested") == "auto" and choose_index(live)[0] != meta["type"]
+    
+    def compact_index(self, user_id: str, doc_id: str) -> Dict[str, Any]:
+        """
+        Rebuild a document's index from its live vectors, keeping their IDs.
+        Vectors are reconstructed from the index, so scalar-quantized types
+        are retrained on already-quantized values; the added error is below
+        one quantization step. Readers keep the old file until the rename.
+        """
+        with self._update_lock(user_id, doc_id):
+            index, meta = self._open_for_update(user_id, doc_id)
+            vectors, ids = self._live_vectors(index, meta)
+            started = time.perf_counter()
+            compacted, new_meta = self.build_index(vectors, meta.get("requested", meta["type"]), ids)
+            # IDs are never reused, even those of vectors removed before compaction
+            new_meta["next_id"] = max(new_meta["next_id"], meta.get("next_id", 0))
+            new_meta = self.write_index(user_id, doc_id, compacted, new_meta)
+        print(f"Compacted index {user_id}/{doc_id}: {meta['ntotal']} -> {new_meta['ntotal']} vectors "
+              f"({new_meta['type']}) in {time.perf_counter() - started:.2f}s")
+        return new_meta
+    
+    def _open_for_update(self, user_id: str, doc_id: str) -> Tuple[faiss.Index, Dict[str, Any]]:
+        """A writable copy of a document's index; indexes built before ID maps are rebuilt with one"""
+        meta = self.get_index_meta(user_id, doc_id)
+        index = read_index_file(self._get_index_path(user_id, doc_id))
+        if not meta.get("id_mapped"):
+            vectors, ids = self._live_vectors(index, meta)
+            index, meta = self.build_index(vectors, meta.get("requested", meta["type"]), ids)
+        return index, meta
+    
+    def _append_vectors(self, index: faiss.Index, meta: Dict[str, Any], embeddings: np.ndarray) -> List[int]:
+        ids = np.arange(meta["next_id"], meta["next_id"] + len(embeddings), dtype='int64')
+        if len(ids):
+            index.add_with_ids(np.ascontiguousarray(embeddings, dtype='float32'), ids)
+            meta["next_id"] = int(ids[-1]) + 1
+            meta["ntotal"] = index.ntotal
+        return ids.tolist()
+    
+    def _remove_vectors(self, index: faiss.Index, meta: Dict[str, Any], ids: Sequence[int]):
+        if not len(ids):
+            return
+        if meta["type"].startswith("hnsw") or meta["type"] == "ivf_pq":
+            meta["tombstones"] = sorted(set(meta.get("tombstones", ())) | {int(i) for i in ids})
+        else:
+            index.remove_ids(faiss.IDSelectorBatch(np.asarray(ids, dtype='int64')))
+            meta["ntotal"] = index.ntotal
+    
+    @staticmethod
+    def _live_vectors(index: faiss.Index, meta: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, IDs) of every vector that is not tombstoned"""
+        inner = faiss.downcast_index(index.index) if meta.get("id_mapped") else index
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            ivf.make_direct_map()  # IVF lists cannot be reconstructed by position without it
+        vectors = inner.reconstruct_n(0, inner.ntotal) if inner.ntotal else np.empty((0, inner.d), dtype='float32')
+        if meta.get("id_mapped"):
+            ids = faiss.vector_to_array(index.id_map)
+        else:
+            ids = np.arange(inner.ntotal, dtype='int64')
+        live = ~np.isin(ids, np.asarray(meta.get("tombstones", ()), dtype='int64'))
+        return vectors[live], ids[live]
+    
+    @contextmanager
+    def _update_lock(self, user_id: str, doc_id: str):
+        """Serializes writers (re-ingestion, compaction) of one document's index across processes"""
+        with open(os.path.join(self.get_index_dir(user_id, doc_id), ".update.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def save_index(self, user_id: str, doc_id: str, staging: faiss.Index,
+                   lexical: Optional[BM25Index] = None) -> Dict[str, Any]:
+        """Build the configured index type from a staging index's vectors and write it"""
+        index, meta = self.build_index(staged_vectors(staging))
+        return self.write_index(user_id, doc_id, index, meta, lexical)
+    
+    def write_index(self, user_id: str, doc_id: str, index: faiss.Index, meta: Dict[str, Any],
+                    lexical: Optional[BM25Index] = None) -> Dict[str, Any]:
+        """
+        Write an index and its metadata to disk, replacing any cached copy,
+        and return the metadata written. Without a new BM25 index the
+        document's current one is kept; vector IDs do not change when an
+        index is rebuilt.
+        """
         index_path = self._get_index_path(user_id, doc_id)
+        meta_path = self._get_meta_path(user_id, doc_id)
         os.makedirs(os.path.dirname(index_path), exist_ok=True)
-        faiss.write_index(index, index_path)
+        if lexical is not None:
+            lexical_path = self._get_lexical_path(user_id, doc_id)
+            lexical.save(f"{lexical_path}.tmp")
+            meta = {**meta, "bm25": {
+                "documents": len(lexical),
+                "bytes": os.path.getsize(f"{lexical_path}.tmp"),
+                "sha256": artifact_store.hash_file(f"{lexical_path}.tmp")
+            }}
+            os.replace(f"{lexical_path}.tmp", lexical_path)
+        elif "bm25" not in meta and os.path.exists(self._get_lexical_path(user_id, doc_id)):
+            meta = {**meta, "bm25": self.get_index_meta(user_id, doc_id).get("bm25")}
+        # Write then rename: processes that have the old file mapped keep
+        # reading the old inode instead of faulting on a truncated file.
+        # Data files are replaced before index.json, whose mtime is the
+        # version readers cache under: a reader racing this write may pair
+        # the new files with the old version, and reloads on its next search,
+        # but never caches old files under the new version.
+        faiss.write_index(index, f"{index_path}.tmp")
+        meta = {
+            **meta,
+            "bytes": os.path.getsize(f"{index_path}.tmp"),
+            "sha256": artifact_store.hash_file(f"{index_path}.tmp")
+        }
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{index_path}.tmp", index_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self.index_cache.invalidate(f"{user_id}/{doc_id}")
+        if settings.INDEX_REMOTE_ENABLED:
+            self.publish_index(user_id, doc_id)
+        return meta
+    
+    def publish_index(self, user_id: str, doc_id: str):
+        """
+        Upload a document's index to object storage. The file is stored
+        under its sha256 and index.json, which names it, is written last, so
+        readers never see metadata for a file that is not there yet.
+        """
+        # Imported here: storage connects to MinIO on import, and offline scripts use this module
+        from app.services.storage import storage_service
         
-        # Return vector IDs (0 to len-1)
-        vector_ids = list(range(len(texts)))
+        index_path = self._get_index_path(user_id, doc_id)
+        meta = self.get_index_meta(user_id, doc_id)
+        if "sha256" not in meta:  # Written before checksums were recorded
+            meta = {**meta, "bytes": os.path.getsize(index_path), "sha256": artifact_store.hash_file(index_path)}
+        previous = self._remote_meta(user_id, doc_id)
         
-        return index, vector_ids
+        prefix = self._remote_prefix(user_id, doc_id)
+        started = time.perf_counter()
+        storage_service.upload_file(index_path, f"{prefix}{meta['sha256']}.faiss")
+        lexical = meta.get("bm25")
+        if lexical:
+            storage_service.upload_file(self._get_lexical_path(user_id, doc_id), f"{prefix}{lexical['sha256']}.bm25.npz")
+        storage_service.upload_bytes(json.dumps(meta).encode("utf-8"), f"{prefix}index.json", "application/json")
+        if previous and previous.get("sha256") != meta["sha256"]:
+            storage_service.delete_object(f"{prefix}{previous['sha256']}.faiss")
+        previous_lexical = (previous or {}).get("bm25")
+        if previous_lexical and previous_lexical["sha256"] != (lexical or {}).get("sha256"):
+            storage_service.delete_object(f"{prefix}{previous_lexical['sha256']}.bm25.npz")
+        print(f"Published index {user_id}/{doc_id} ({meta['bytes'] / 1e6:.1f} MB) in {time.perf_counter() - started:.2f}s")
     
-    def search(self, user_id: str, doc_id: str, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
-        """Search for similar chunks"""
-        # Load index if not cached
-        index_key = f"{user_id}/{doc_id}"
-        if index_key not in self.indexes:
-            index_path = self._get_index_path(user_id, doc_id)
-            if not os.path.exists(index_path):
-                return []
-            self.indexes[index_key] = faiss.read_index(index_path)
+    def create_index(self, user_id: str, doc_id: str, texts: List[str]) -> Tuple[faiss.Index, List[int]]:
+        """Create a FAISS index, and the BM25 index beside it, for document chunks"""
+        embeddings = self.embed_documents(texts)
         
-        index = self.indexes[index_key]
+        index, meta = self.build_index(embeddings)
+        lexical = BM25Builder()
+        lexical.add(range(len(texts)), texts)
+        self.write_index(user_id, doc_id, index, meta, lexical.build())
         
-        # Embed query
-        query_embedding = self.embed_texts([query])[0]
+        return index, list(range(index.ntotal))
+    
+    def search(self, user_id: str, doc_id: str, query: str, top_k: int = 10,
+               latency_budget_ms: Optional[float] = None) -> List[Tuple[int, float]]:
+        """
+        Search for similar chunks, within latency_budget_ms (default
+        SEARCH_LATENCY_BUDGET_MS) if possible. Scores are L2 distances
+        (lower is better), or with ENABLE_BM25 and a BM25 index, reciprocal
+        rank fusion scores of the dense and BM25 rankings (higher is better).
+        """
+        # Load index if not cached
+        key = f"{user_id}/{doc_id}"
+        loaded = self.index_cache.get_or_load(key, lambda: self._load_index(user_id, doc_id))
+        if loaded is not None and self._is_stale(user_id, doc_id, loaded):
+            # Rewritten by another process since it was cached (a worker appended, removed or compacted)
+            self.index_cache.invalidate(key)
+            loaded = self.index_cache.get_or_load(key, lambda: self._load_index(user_id, doc_id))
+        if loaded is None:
+            return []
+        index = loaded.index
+        hybrid = settings.ENABLE_BM25 and loaded.lexical is not None
+        candidates = max(top_k, settings.HYBRID_CANDIDATES) if hybrid else top_k
+        
+        # Embed query (cache hits skip the model)
+        query_embedding = self.embed_query(query)
         
         # Search
         distances, indices = index.search(
             query_embedding.reshape(1, -1).astype('float32'),
-            top_k
+            candidates,
+            params=self._search_params(loaded.meta, latency_budget_ms, loaded.deleted)
         )
         
         # Return (vector_id, score) pairs
@@ -76,20 +945,188 @@ class VectorService:
             if indices[0][i] != -1
         ]
         
+        if hybrid:
+            lexical_results = loaded.lexical.search(query, candidates)
+            results = reciprocal_rank_fusion([results, lexical_results], settings.RRF_K)[:top_k]
+        
         return results
     
     def delete_index(self, user_id: str, doc_id: str):
-        """Delete a FAISS index"""
+        """Delete a FAISS index and any ingestion checkpoint files next to it"""
+        index_dir = self.get_index_dir(user_id, doc_id)
+        # Shared (deduplicated) indexes are only freed by their last owner
+        if not artifact_store.release(user_id, doc_id, index_dir) and os.path.isdir(index_dir):
+            shutil.rmtree(index_dir)
+        if settings.INDEX_REMOTE_ENABLED:
+            from app.services.storage import storage_service
+            storage_service.delete_prefix(self._remote_prefix(user_id, doc_id))
+        
+        self.index_cache.invalidate(f"{user_id}/{doc_id}")
+    
+    def _load_index(self, user_id: str, doc_id: str) -> Optional[Tuple[LoadedIndex, int]]:
+        """
+        Read an index from the local volume or, on nodes without it, from the
+        disk cache of published indexes; its file size stands in for its
+        memory footprint
+        """
         index_path = self._get_index_path(user_id, doc_id)
+        version = remote_version = None
         if os.path.exists(index_path):
-            os.remove(index_path)
+            version = self._local_version(user_id, doc_id)
+            meta = self.get_index_meta(user_id, doc_id)
+        elif self.disk_cache is not None:
+            self._remote_checked[f"{user_id}/{doc_id}"] = time.monotonic()
+            meta = self._remote_meta(user_id, doc_id)
+            if meta is None:
+                return None
+            remote_version = self._remote_version(meta)
+            index_path = self._fetch_remote(user_id, doc_id, meta["sha256"], ".faiss")
+        else:
+            return None
+        index = read_index_file(index_path, settings.INDEX_MMAP)
+        nbytes = os.path.getsize(index_path)
         
-        index_key = f"{user_id}/{doc_id}"
-        if index_key in self.indexes:
-            del self.indexes[index_key]
+        lexical = None
+        if meta.get("bm25"):
+            lexical_path = self._get_lexical_path(user_id, doc_id)
+            if remote_version is not None:
+                lexical_path = self._fetch_remote(user_id, doc_id, meta["bm25"]["sha256"], ".bm25.npz")
+            lexical = BM25Index.load(lexical_path, settings.BM25_K1, settings.BM25_B)
+            nbytes += lexical.nbytes
+        deleted = None
+        if meta.get("tombstones"):
+            tombstones = faiss.IDSelectorBatch(np.asarray(meta["tombstones"], dtype='int64'))
+            deleted = faiss.IDSelectorNot(tombstones)
+            deleted.referenced_objects = [tombstones]  # IDSelectorNot does not own its argument
+        return LoadedIndex(index, meta, deleted, version or remote_version, lexical), nbytes
+    
+    def _fetch_remote(self, user_id: str, doc_id: str, sha256: str, suffix: str) -> str:
+        """Local path of a published file, downloaded into the disk cache if needed"""
+        from app.services.storage import storage_service
+        key = f"{self._remote_prefix(user_id, doc_id)}{sha256}{suffix}"
+        return self.disk_cache.get(sha256, lambda path: storage_service.download_file(key, path), suffix)
+    
+    def _is_stale(self, user_id: str, doc_id: str, loaded: LoadedIndex) -> bool:
+        """
+        Whether a cached index has been rewritten since it was loaded. Local
+        files are checked on every search (one stat); published indexes at
+        most every INDEX_REMOTE_REVALIDATE_SECONDS, by re-reading index.json.
+        """
+        if loaded.version is None:
+            return False
+        if not isinstance(loaded.version, tuple):
+            return loaded.version != self._local_version(user_id, doc_id)
+        
+        key = f"{user_id}/{doc_id}"
+        now = time.monotonic()
+        if now - self._remote_checked.get(key, 0.0) < settings.INDEX_REMOTE_REVALIDATE_SECONDS:
+            return False
+        self._remote_checked[key] = now  # Concurrent searches skip the check while this one runs
+        try:
+            meta = self._remote_meta(user_id, doc_id)
+        except Exception as e:
+            print(f"Failed to revalidate index {key}: {e}")
+            return False  # Keep serving the cached copy while object storage is unreachable
+        return meta is None or self._remote_version(meta) != loaded.version
+    
+    @staticmethod
+    def _remote_version(meta: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        return meta["sha256"], (meta.get("bm25") or {}).get("sha256")
+    
+    def _local_version(self, user_id: str, doc_id: str) -> Optional[int]:
+        try:
+            return os.stat(self._get_meta_path(user_id, doc_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _remote_meta(self, user_id: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        from app.services.storage import storage_service
+        data = storage_service.read_object(f"{self._remote_prefix(user_id, doc_id)}index.json")
+        return json.loads(data) if data is not None else None
+    
+    @staticmethod
+    def _remote_prefix(user_id: str, doc_id: str) -> str:
+        return f"{settings.INDEX_REMOTE_PREFIX}/{user_id}/{doc_id}/"
+    
+    def get_index_meta(self, user_id: str, doc_id: str) -> Dict[str, Any]:
+        """The index's recorded type and parameters; indexes older than index.json are hnsw_flat"""
+        try:
+            with open(self._get_meta_path(user_id, doc_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"type": "hnsw_flat", "dimension": self.dimension, "params": {}}
+    
+    def get_index_dir(self, user_id: str, doc_id: str) -> str:
+        return os.path.join(settings.FAISS_DATA_DIR, user_id, doc_id)
     
     def _get_index_path(self, user_id: str, doc_id: str) -> str:
-        return f"/data/faiss/{user_id}/{doc_id}/index.faiss"
+        return os.path.join(self.get_index_dir(user_id, doc_id), "index.faiss")
+    
+    def _get_meta_path(self, user_id: str, doc_id: str) -> str:
+        return os.path.join(self.get_index_dir(user_id, doc_id), "index.json")
+    
+    def _get_lexical_path(self, user_id: str, doc_id: str) -> str:
+        return os.path.join(self.get_index_dir(user_id, doc_id), "bm25.npz")
+    
+    def _calibrate_ef_search(self, index: faiss.Index, embeddings: np.ndarray) -> List[List[float]]:
+        """
+        [efSearch, recall@10, mean ms per query] for increasing efSearch from
+        INDEX_EF_SEARCH, stopping at the first that reaches
+        INDEX_TARGET_RECALL. Queries are random indexed vectors moved off
+        the chunk by unit noise of norm 0.5, so the query is not itself
+        indexed; exact neighbours come from brute force.
+        """
+        k = min(CALIBRATION_K, len(embeddings))
+        rng = np.random.default_rng(0)
+        noise = rng.standard_normal((CALIBRATION_QUERIES, embeddings.shape[1]), dtype=np.float32)
+        faiss.normalize_L2(noise)
+        queries = embeddings[rng.integers(0, len(embeddings), CALIBRATION_QUERIES)] + 0.5 * noise
+        faiss.normalize_L2(queries)
+        _, truth = faiss.knn(queries, embeddings, k)
+        
+        candidates = [ef for ef in EF_SEARCH_CANDIDATES if ef >= settings.INDEX_EF_SEARCH] or [settings.INDEX_EF_SEARCH]
+        profile = []
+        for ef_search in candidates:
+            params = faiss.SearchParametersHNSW(efSearch=ef_search)
+            start = time.perf_counter()
+            found = [index.search(query.reshape(1, -1), k, params=params)[1][0] for query in queries]
+            elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)])
+            profile.append([ef_search, round(float(recall), 4), round(elapsed_ms, 3)])
+            if recall >= settings.INDEX_TARGET_RECALL:
+                break
+        return profile
+    
+    @staticmethod
+    def _search_params(meta: Dict[str, Any], latency_budget_ms: Optional[float],
+                       deleted: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+        """
+        Per-query parameters: the selector that skips tombstoned IDs and,
+        for HNSW, the calibrated efSearch, lowered to the largest profiled
+        value whose latency fits the budget. Passed per call because cached
+        indexes are shared between threads.
+        """
+        profile = meta["params"].get("ef_profile")
+        if not profile and deleted is None:
+            return None
+        if meta["type"] == "ivf_pq":
+            # Per-call parameters replace the index's own nprobe, so it is passed along
+            return faiss.SearchParametersIVF(sel=deleted, nprobe=meta["params"]["nprobe"])
+        params = faiss.SearchParametersHNSW()
+        if profile:
+            budget = settings.SEARCH_LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+            affordable = [ef_search for ef_search, recall, latency_ms in profile if latency_ms <= budget]
+            params.efSearch = max(affordable) if affordable else profile[0][0]
+        if deleted is not None:
+            params.sel = deleted
+        return params
+    
+    @staticmethod
+    def _training_sample(embeddings: np.ndarray) -> np.ndarray:
+        if len(embeddings) <= TRAIN_SAMPLE_MAX:
+            return embeddings
+        rows = np.random.default_rng(0).choice(len(embeddings), TRAIN_SAMPLE_MAX, replace=False)
+        return embeddings[np.sort(rows)]
 
 
 vector_service = VectorService()
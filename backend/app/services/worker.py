@@ -1,26 +1,126 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
 import redis
-from rq import Queue
+from rq import Queue, Retry
 from app.core.config import settings
+from app.services.progress import ProgressReporter, get_progress
+from app.services.metrics import percentile
 
 # Connect to Redis
 redis_conn = redis.from_url(settings.REDIS_URL)
-queue = Queue('default', connection=redis_conn)
 
+# Ingestion queues by estimated cost, cheapest first; 'default' drains jobs
+# enqueued before size-aware routing existed
+INGEST_QUEUE_NAMES = ["ingest-small", "ingest-medium", "ingest-large"]
+queues = {name: Queue(name, connection=redis_conn) for name in INGEST_QUEUE_NAMES + ["default"]}
+
+QUEUE_WAIT_SAMPLES = 1000
+
+
+def select_ingest_queue(file_size: Optional[int] = None, page_count: Optional[int] = None) -> Queue:
+    """Route by page count when a previous run recorded it, else by PDF size"""
+    if page_count:
+        if page_count <= settings.INGEST_SMALL_MAX_PAGES:
+            return queues["ingest-small"]
+        if page_count >= settings.INGEST_LARGE_MIN_PAGES:
+            return queues["ingest-large"]
+        return queues["ingest-medium"]
+    if file_size is not None:
+        size_mb = file_size / (1024 * 1024)
+        if size_mb <= settings.INGEST_SMALL_MAX_MB:
+            return queues["ingest-small"]
+        if size_mb >= settings.INGEST_LARGE_MIN_MB:
+            return queues["ingest-large"]
+    return queues["ingest-medium"]
 
-def enqueue_ingest_job(doc_id: str, user_id: str):
-    """Enqueue a document ingestion job"""
+
+def enqueue_ingest_job(doc_id: str, user_id: str, file_size: Optional[int] = None, page_count: Optional[int] = None):
+    """Enqueue a document ingestion job on the queue matching its estimated cost"""
+    # Clear any snapshot left by a previous run of this document
+    ProgressReporter(doc_id).update("queued")
+    
     # Import with the full path that the worker will use
-    job = queue.enqueue(
+    job = select_ingest_queue(file_size, page_count).enqueue(
         'tasks.ingest_document',  # String reference instead of function import
         doc_id=doc_id,
         user_id=user_id,
-        job_timeout=settings.INGEST_TIMEOUT_SECONDS
+        job_timeout=settings.INGEST_TIMEOUT_SECONDS,
+        # Retries resume from the worker's last ingestion checkpoint
+        retry=Retry(max=settings.INGEST_MAX_RETRIES, interval=settings.INGEST_RETRY_INTERVAL_SECONDS)
     )
     return job
 
 
+def enqueue_reingest_job(doc_id: str, user_id: str, pages: List[int]):
+    """Re-ingest only the given pages of an ingested document"""
+    return queues["ingest-small"].enqueue(
+        'tasks.reingest_pages',
+        doc_id=doc_id,
+        user_id=user_id,
+        page_numbers=pages,
+        job_timeout=settings.INGEST_TIMEOUT_SECONDS,
+        retry=Retry(max=settings.INGEST_MAX_RETRIES, interval=settings.INGEST_RETRY_INTERVAL_SECONDS)
+    )
+
+
+def enqueue_compaction_job(doc_id: str, user_id: str):
+    """Rebuild a document's index without its tombstoned vectors, behind any ingestion"""
+    return queues["default"].enqueue(
+        'tasks.compact_index',
+        doc_id=doc_id,
+        user_id=user_id,
+        job_timeout=settings.INGEST_TIMEOUT_SECONDS
+    )
+
+
 def get_job_status(doc_id: str):
-    """Get the status of an ingestion job"""
-    # For now, return a simple status
-    # In production, you'd store job_id -> doc_id mapping
-    return {"progress": None}
\ No newline at end of file
+    """Get the latest progress the worker published for an ingestion job"""
+    return get_progress(doc_id) or {"progress": None}
+
+
+def publish_worker_health(worker_name: str, health: Dict, ttl_seconds: int = 300):
+    """Workers refresh this after startup, every job and periodically while idle; stale entries expire"""
+    redis_conn.set(f"ingest:worker_health:{worker_name}", json.dumps(health), ex=ttl_seconds)
+
+
+def get_worker_health() -> List[Dict]:
+    keys = sorted(redis_conn.scan_iter("ingest:worker_health:*"))
+    return [json.loads(raw) for raw in redis_conn.mget(keys) if raw] if keys else []
+
+
+def _queue_wait_key(queue_name: str) -> str:
+    return f"ingest:queue_wait:{queue_name}"
+
+
+def record_queue_wait(queue_name: str, wait_seconds: float):
+    """Called by workers when a job starts: keep the most recent waits per queue"""
+    pipe = redis_conn.pipeline()
+    pipe.lpush(_queue_wait_key(queue_name), f"{wait_seconds:.3f}")
+    pipe.ltrim(_queue_wait_key(queue_name), 0, QUEUE_WAIT_SAMPLES - 1)
+    pipe.execute()
+
+
+def get_queue_metrics() -> List[Dict]:
+    """Depth, oldest queued job age and recent wait percentiles per ingestion queue"""
+    metrics = []
+    for name, queue in queues.items():
+        waits = sorted(float(w) for w in redis_conn.lrange(_queue_wait_key(name), 0, -1))
+        oldest_age = None
+        oldest_ids = queue.get_job_ids(0, 0)
+        if oldest_ids:
+            oldest = queue.fetch_job(oldest_ids[0])
+            if oldest and oldest.enqueued_at:
+                # rq stores naive UTC datetimes
+                oldest_age = round((datetime.utcnow() - oldest.enqueued_at).total_seconds(), 1)
+        metrics.append({
+            "queue": name,
+            "depth": queue.count,
+            "oldest_queued_seconds": oldest_age,
+            "wait_samples": len(waits),
+            "wait_p50_seconds": percentile(waits, 0.50),
+            "wait_p95_seconds": percentile(waits, 0.95),
+            "wait_max_seconds": waits[-1] if waits else None
+        })
+    return metrics
@@ -23,9 +23,29 @@ app.include_router(documents.router, prefix="/api", tags=["documents"])
 app.include_router(chats.router, prefix="/api/chats", tags=["chats"])
 app.include_router(ask.router, prefix="/api", tags=["ask"])
 
+@app.on_event("startup")
+async def warm_up_reranker():
+    # Load the cross-encoder in the background so early questions fall back
+    # to retrieval order within their budget instead of waiting for the load
+    if settings.ENABLE_RERANKER:
+        from app.services.reranker import reranker
+        reranker.warm_up()
+
 @app.get("/api/healthz")
 async def healthcheck():
-    return {"status": "ok", "version": "1.0.0"}
+    from app.services.reranker import reranker
+    from app.services.retrieval import retrieval_executor
+    from app.services.vector import vector_service
+    query_cache = vector_service.query_cache.stats() if vector_service.query_cache else None
+    return {
+        "status": "ok",
+        "version": "1.0.0",
+        "index_cache": vector_service.index_cache.stats(),
+        "index_disk_cache": vector_service.disk_cache.stats() if vector_service.disk_cache else None,
+        "query_cache": query_cache,
+        "retrieval": retrieval_executor.stats(),
+        "reranker": reranker.stats() if settings.ENABLE_RERANKER else None
+    }
 
 # Serve Next.js static files (production)
 if os.path.exists("/app/frontend/out"):
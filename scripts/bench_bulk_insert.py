@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark Page/Chunk persistence throughput (rows/sec) against DATABASE_URL.
+
+Usage:
+  python scripts/bench_bulk_insert.py [--chunks 100000] [--chunks-per-page 4]
+                                      [--methods orm,executemany,copy]
+
+A throwaway user and document are created per method and deleted afterwards
+(pages and chunks go with them via ON DELETE CASCADE).
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+from sqlalchemy import create_engine, insert, delete
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.models.user import User
+from app.models.document import Document, Page, Chunk
+from persistence import insert_pages, insert_chunks
+
+CHUNK_TEXT = "Stress is force per unit area; strain is the resulting deformation. " * 8
+
+
+def create_owner(db):
+    now = datetime.utcnow()
+    user_id, doc_id = uuid.uuid4(), uuid.uuid4()
+    db.execute(insert(User.__table__).values(
+        id=user_id, email=f"bench-{user_id}@example.com", name="bench",
+        hashed_password="x", created_at=now, updated_at=now
+    ))
+    db.execute(insert(Document.__table__).values(
+        id=doc_id, user_id=user_id, title="bench", filename="bench.pdf",
+        status="running", created_at=now, updated_at=now
+    ))
+    db.commit()
+    return user_id, doc_id
+
+
+def run_orm(db, doc_id, pages, chunks_per_page, batch_pages):
+    """The original path: add + flush per page, then one ORM add per chunk"""
+    vector_id = 0
+    for start in range(0, len(pages), batch_pages):
+        for page_number, text in pages[start:start + batch_pages]:
+            page = Page(document_id=doc_id, page_number=page_number, text=text)
+            db.add(page)
+            db.flush()
+            for i in range(chunks_per_page):
+                db.add(Chunk(
+                    document_id=doc_id, page_id=page.id, page_number=page_number,
+                    text=CHUNK_TEXT, char_start=i * 600, char_end=(i + 1) * 600,
+                    vector_id=vector_id
+                ))
+                vector_id += 1
+        db.commit()
+
+
+def run_bulk(db, doc_id, pages, chunks_per_page, batch_pages, method):
+    vector_id = 0
+    for start in range(0, len(pages), batch_pages):
+        batch = pages[start:start + batch_pages]
+        page_ids = insert_pages(db, doc_id, batch, method=method)
+        chunks = []
+        for page_id, (page_number, _) in zip(page_ids, batch):
+            for i in range(chunks_per_page):
+                chunks.append({
+                    "page_id": page_id, "page_number": page_number, "text": CHUNK_TEXT,
+                    "char_start": i * 600, "char_end": (i + 1) * 600, "vector_id": vector_id
+                })
+                vector_id += 1
+        insert_chunks(db, doc_id, chunks, method=method)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--chunks-per-page", type=int, default=4)
+    parser.add_argument("--batch-pages", type=int, default=settings.INGEST_BATCH_PAGES)
+    parser.add_argument("--methods", default="orm,executemany,copy")
+    args = parser.parse_args()
+    
+    page_total = args.chunks // args.chunks_per_page
+    pages = [(n + 1, CHUNK_TEXT * args.chunks_per_page) for n in range(page_total)]
+    row_total = page_total + page_total * args.chunks_per_page
+    
+    engine = create_engine(settings.DATABASE_URL)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    
+    print(f"{page_total} pages + {page_total * args.chunks_per_page} chunks = {row_total} rows")
+    print(f"{'method':>12}  {'seconds':>8}  {'rows/sec':>10}")
+    for method in args.methods.split(","):
+        db = Session()
+        user_id, doc_id = create_owner(db)
+        try:
+            start = time.perf_counter()
+            if method == "orm":
+                run_orm(db, doc_id, pages, args.chunks_per_page, args.batch_pages)
+            else:
+                run_bulk(db, doc_id, pages, args.chunks_per_page, args.batch_pages, method)
+            elapsed = time.perf_counter() - start
+            print(f"{method:>12}  {elapsed:>8.2f}  {row_total / elapsed:>10.0f}")
+        finally:
+            db.rollback()
+            db.execute(delete(User.__table__).where(User.__table__.c.id == user_id))
+            db.commit()
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark the chunking strategies.
+
+Usage:
+  python scripts/bench_chunking.py [--pages 2000] [--budget 600] [--overlap 80]
+                                   [--tokenizer BAAI/bge-m3]
+
+Reports pages/sec, chunks per page, mean chunk length and the share of tiny
+chunks per strategy. The token strategy runs only when --tokenizer is given
+(loaded with transformers.AutoTokenizer). The offset invariants every
+strategy must keep are tested in worker/tests/test_chunking.py.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+from chunking import STRATEGIES, make_chunker
+
+WORDS = (
+    "stress strain modulus Poisson's ratio eq. 4.12 yield shear beam torsion "
+    "deflection (see Fig. 3) E = 200 GPa elastic plastic the of a and to in"
+).split()
+
+
+def random_page(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(0, 14)):
+        sentences = []
+        for _ in range(rng.randint(1, 7)):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 45)))
+            sentences.append(words + rng.choice([".", "!", "?", "", ":"]))
+        paragraphs.append(rng.choice([" ", "\n"]).join(sentences))
+    separator = rng.choice(["\n\n", "\n \n", "\n\n\n"])
+    return rng.choice(["", "  \n"]) + separator.join(paragraphs) + rng.choice(["", "\n", " \n\n"])
+
+
+def chunk_pages(chunker, pages):
+    chunks = []
+    for page_number, text in pages:
+        chunks.extend(chunker.feed(page_number, text))
+    chunks.extend(chunker.flush())
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--budget", type=int, default=600)
+    parser.add_argument("--overlap", type=int, default=80)
+    parser.add_argument("--tokenizer", help="Tokenizer name/path for the token strategy")
+    parser.add_argument("--token-budget", type=int, default=256)
+    args = parser.parse_args()
+    
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    strategies = [s for s in STRATEGIES if s != "token" or tokenizer is not None]
+    
+    rng = random.Random(42)
+    pages = [(n + 1, random_page(rng)) for n in range(args.pages)]
+    
+    print(f"{'strategy':>10}  {'pages/sec':>10}  {'chunks/page':>11}  {'mean chars':>10}  {'<100 chars':>10}")
+    for strategy in strategies:
+        budget = args.token_budget if strategy == "token" else args.budget
+        overlap = args.overlap * args.token_budget // args.budget if strategy == "token" else args.overlap
+        start = time.perf_counter()
+        chunks = chunk_pages(make_chunker(strategy, budget, overlap, tokenizer), pages)
+        elapsed = time.perf_counter() - start
+        
+        lengths = [len(chunk["text"]) for chunk in chunks] or [0]
+        tiny = sum(1 for length in lengths if length < 100) / len(lengths)
+        print(f"{strategy:>10}  {len(pages) / elapsed:>10.0f}  {len(chunks) / len(pages):>11.2f}"
+              f"  {sum(lengths) / len(lengths):>10.0f}  {tiny:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare embedding backends: throughput, and agreement with the FP32
+PyTorch reference.
+
+Usage:
+  python scripts/bench_embedding_backends.py [--pdf book.pdf] [--chunks 512]
+                                             [--backends torch torch_int8 onnx] [--json]
+
+Texts are the PDF's chunks (CHUNK_STRATEGY/CHUNK_SIZE settings) or, without
+--pdf, synthetic paragraphs. Every backend embeds the same texts; the
+first run per backend is a warm-up. Agreement is the cosine between each
+text's vector and the torch FP32 vector (mean, 1st percentile, min), and
+the overlap of each chunk's 10 nearest chunks under both embeddings, i.e.
+how often retrieval would return the same neighbours. The onnx backend
+needs a model exported with scripts/export_onnx.py at EMBEDDING_ONNX_DIR.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+import faiss
+from app.core.config import settings
+from app.services.vector import EMBEDDING_BACKENDS, load_embedding_backend
+from chunking import make_chunker
+
+WORDS = (
+    "stress strain modulus Poisson's ratio yield shear beam torsion deflection "
+    "elastic plastic load column buckling fatigue fracture the of a and to in is"
+).split()
+
+
+def pdf_chunks(path: str, limit: int) -> list:
+    import fitz
+    chunker = make_chunker(settings.CHUNK_STRATEGY, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+    texts = []
+    with fitz.open(path) as pdf:
+        for page_number, page in enumerate(pdf, start=1):
+            texts.extend(chunk["text"] for chunk in chunker.feed(page_number, page.get_text()))
+            if len(texts) >= limit:
+                break
+    texts.extend(chunk["text"] for chunk in chunker.flush())
+    return texts[:limit]
+
+
+def synthetic_chunks(count: int, mixed: bool = False) -> list:
+    """Paragraphs of 20-120 words; with mixed, a third are 2-8 word headings"""
+    rng = random.Random(0)
+    chunks = []
+    for _ in range(count):
+        words = rng.randint(2, 8) if mixed and rng.random() < 1 / 3 else rng.randint(20, 120)
+        chunks.append(" ".join(rng.choice(WORDS) for _ in range(words)) + ".")
+    return chunks
+
+
+def run_backend(name: str, texts: list, batch_size: int):
+    start = time.perf_counter()
+    backend = load_embedding_backend(name)
+    load_seconds = time.perf_counter() - start
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # Warm-up
+    start = time.perf_counter()
+    embeddings = backend.encode(texts, batch_size=batch_size)
+    encode_seconds = time.perf_counter() - start
+    del backend
+    gc.collect()
+    return np.ascontiguousarray(embeddings, dtype=np.float32), load_seconds, encode_seconds
+
+
+def neighbour_overlap(embeddings: np.ndarray, reference: np.ndarray, k: int = 10) -> float:
+    k = min(k + 1, len(embeddings))
+    _, found = faiss.knn(embeddings, embeddings, k)
+    _, expected = faiss.knn(reference, reference, k)
+    # Drop each chunk itself; it is its own nearest neighbour in both
+    return float(np.mean([
+        len(set(row[1:]) & set(truth[1:])) / max(k - 1, 1) for row, truth in zip(found, expected)
+    ]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    texts = pdf_chunks(args.pdf, args.chunks) if args.pdf else synthetic_chunks(args.chunks)
+    backends = ["torch"] + [name for name in args.backends if name != "torch"]
+    if not args.json:
+        print(f"{len(texts)} chunks, mean {sum(map(len, texts)) / len(texts):.0f} chars, batch size {args.batch_size}")
+        print(f"{'backend':>10}  {'load s':>7}  {'chunks/s':>9}  {'cos mean':>8}  {'cos p1':>7}  {'cos min':>7}  {'knn@10':>6}")
+
+    reference = None
+    for name in backends:
+        embeddings, load_seconds, encode_seconds = run_backend(name, texts, args.batch_size)
+        if reference is None:
+            reference = embeddings
+        cosines = np.sum(embeddings * reference, axis=1)
+        result = {
+            "backend": name,
+            "load_seconds": round(load_seconds, 2),
+            "chunks_per_second": round(len(texts) / encode_seconds, 1),
+            "cosine_mean": round(float(cosines.mean()), 5),
+            "cosine_p1": round(float(np.percentile(cosines, 1)), 5),
+            "cosine_min": round(float(cosines.min()), 5),
+            "knn10_overlap": round(neighbour_overlap(embeddings, reference), 4)
+        }
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{name:>10}  {result['load_seconds']:>7.2f}  {result['chunks_per_second']:>9.1f}  "
+                  f"{result['cosine_mean']:>8.5f}  {result['cosine_p1']:>7.5f}  {result['cosine_min']:>7.5f}  "
+                  f"{result['knn10_overlap']:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
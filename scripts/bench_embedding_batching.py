@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Tune ingestion embedding batching: chunks/sec for arrival-order batches
+against length-bucketed batches at several token budgets.
+
+Usage:
+  python scripts/bench_embedding_batching.py [--pdf book.pdf] [--chunks 1024]
+                                             [--budgets 4096 8192 16384 32768] [--threads 8]
+
+Texts are the PDF's chunks or synthetic paragraphs of mixed length (see
+bench_embedding_backends.py). --threads sets EMBEDDING_THREADS for the
+run; the backend is EMBEDDING_BACKEND. The baseline is one model.encode
+call over the texts in arrival order with batch size 32; each budget runs
+VectorService.embed_batched with EMBEDDING_BATCH_TOKENS set to it.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.core.config import settings
+from app.services.vector import vector_service
+from bench_embedding_backends import pdf_chunks, synthetic_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf")
+    parser.add_argument("--chunks", type=int, default=1024)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[4096, 8192, 16384, 32768])
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    args = parser.parse_args()
+
+    settings.EMBEDDING_THREADS = args.threads
+    texts = pdf_chunks(args.pdf, args.chunks) if args.pdf else synthetic_chunks(args.chunks, mixed=True)
+    vector_service.warm_up()
+    lengths = vector_service.token_lengths(texts)
+    print(f"{len(texts)} chunks, {sum(lengths)} tokens (max {max(lengths)}), "
+          f"{settings.EMBEDDING_BACKEND} backend, threads={args.threads or 'default'}")
+    print(f"{'batching':>16}  {'seconds':>8}  {'chunks/s':>9}  {'tokens/s':>9}")
+
+    start = time.perf_counter()
+    vector_service.model.encode(texts, batch_size=32)
+    elapsed = time.perf_counter() - start
+    print(f"{'arrival, 32':>16}  {elapsed:>8.2f}  {len(texts) / elapsed:>9.1f}  {sum(lengths) / elapsed:>9.0f}")
+
+    for budget in args.budgets:
+        settings.EMBEDDING_BATCH_TOKENS = budget
+        start = time.perf_counter()
+        vector_service.embed_batched(texts)
+        elapsed = time.perf_counter() - start
+        print(f"{f'{budget} tokens':>16}  {elapsed:>8.2f}  {len(texts) / elapsed:>9.1f}  {sum(lengths) / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
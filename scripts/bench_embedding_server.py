@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Measure query embedding throughput and latency under concurrency, in
+process against the shared embedding server.
+
+Usage:
+  python scripts/bench_embedding_server.py [--concurrency 1 4 16 32] [--requests 256]
+                                           [--ingest-load] [--json]
+
+"local" loads the model in this process and has every thread call it
+with a batch of one, as each API process did before. "server" sends the
+same calls to the embedding server at EMBEDDING_SERVER_SOCKET, which must
+already be running (python -m app.services.embedding_server). With
+--ingest-load a background thread keeps the server busy with 256-text
+ingestion requests, showing how query priority holds latency down.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.core.config import settings
+from app.services.embedding_server import EmbeddingClient
+from app.services.vector import vector_service
+from bench_embedding_backends import synthetic_chunks
+
+
+def run(embed, questions: list, concurrency: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def one(question: str):
+        start = time.perf_counter()
+        embed([question])
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, questions))
+    elapsed = time.perf_counter() - start
+    return {
+        "queries_per_second": round(len(questions) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--modes", nargs="+", default=["local", "server"], choices=["local", "server"])
+    parser.add_argument("--ingest-load", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    questions = [f"question {i}: {text[:120]}" for i, text in enumerate(synthetic_chunks(args.requests))]
+    client = EmbeddingClient(settings.EMBEDDING_SERVER_SOCKET, settings.EMBEDDING_SERVER_TIMEOUT_SECONDS)
+    modes = {
+        "local": lambda texts: vector_service.model.encode(texts),
+        "server": lambda texts: client.embed(texts, "query")
+    }
+    if "local" in args.modes:
+        vector_service.embedding_client = None
+        vector_service.warm_up()
+
+    stop = threading.Event()
+    if args.ingest_load:
+        chunks = synthetic_chunks(256, mixed=True)
+        flood = EmbeddingClient(settings.EMBEDDING_SERVER_SOCKET, settings.EMBEDDING_SERVER_TIMEOUT_SECONDS)
+        
+        def ingest_forever():
+            while not stop.is_set():
+                flood.embed(chunks, "ingest")
+        
+        threading.Thread(target=ingest_forever, daemon=True).start()
+
+    if not args.json:
+        print(f"{args.requests} queries per run{', with ingestion load' if args.ingest_load else ''}")
+        print(f"{'mode':>7}  {'threads':>7}  {'queries/s':>9}  {'p50 ms':>8}  {'p99 ms':>8}")
+    try:
+        for mode in args.modes:
+            for concurrency in args.concurrency:
+                result = {"mode": mode, "concurrency": concurrency, **run(modes[mode], questions, concurrency)}
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(f"{mode:>7}  {concurrency:>7}  {result['queries_per_second']:>9.1f}  "
+                          f"{result['p50_ms']:>8.1f}  {result['p99_ms']:>8.1f}")
+        if "server" in args.modes and not args.json:
+            print(f"server: {client.stats()}")
+    finally:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()
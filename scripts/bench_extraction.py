@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDF text extraction throughput (pages/sec) against process count.
+
+Usage:
+  python scripts/bench_extraction.py [path/to/book.pdf] [--pages 1000] [--max-procs 8]
+
+Without a PDF path a synthetic text-only PDF with --pages pages is generated.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+import fitz  # PyMuPDF
+from extraction import extract_pages
+
+PARAGRAPH = (
+    "The elastic modulus of a material describes its stiffness under uniaxial "
+    "loading. Within the proportional limit, stress is linearly related to strain, "
+    "and the slope of that line is Young's modulus. "
+)
+
+
+def make_synthetic_pdf(path: str, page_total: int):
+    pdf_doc = fitz.open()
+    for page_num in range(page_total):
+        page = pdf_doc.new_page()
+        text = f"Chapter {page_num // 20 + 1}, page {page_num + 1}\n\n" + (PARAGRAPH * 12)
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), text, fontsize=9)
+    pdf_doc.save(path)
+    pdf_doc.close()
+
+
+def run(pdf_path: str, processes: int, shard_size: int) -> tuple:
+    start = time.perf_counter()
+    page_count = sum(1 for _ in extract_pages(pdf_path, processes=processes, shard_size=shard_size))
+    return page_count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF to extract (default: generate one)")
+    parser.add_argument("--pages", type=int, default=1000, help="Synthetic PDF page count")
+    parser.add_argument("--max-procs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-size", type=int, default=32)
+    args = parser.parse_args()
+    
+    tmp_path = None
+    pdf_path = args.pdf
+    if not pdf_path:
+        tmp_path = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False).name
+        print(f"Generating {args.pages}-page synthetic PDF...")
+        make_synthetic_pdf(tmp_path, args.pages)
+        pdf_path = tmp_path
+    
+    try:
+        counts = [1]
+        while counts[-1] * 2 <= args.max_procs:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != args.max_procs:
+            counts.append(args.max_procs)
+        
+        print(f"{'procs':>5}  {'pages':>6}  {'seconds':>8}  {'pages/sec':>10}  {'speedup':>7}")
+        baseline = None
+        for processes in counts:
+            page_count, elapsed = run(pdf_path, processes, args.shard_size)
+            rate = page_count / elapsed if elapsed else 0.0
+            baseline = baseline or rate
+            print(f"{processes:>5}  {page_count:>6}  {elapsed:>8.2f}  {rate:>10.1f}  {rate / baseline:>6.2f}x")
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Compare loading a FAISS index by copying it into process memory against
+mapping it read-only, as the API does with INDEX_MMAP.
+
+Usage:
+  python scripts/bench_index_load.py path/to/index.faiss [--processes 4]
+  python scripts/bench_index_load.py --vectors 200000 [--processes 4]
+
+Without a path a synthetic HNSW index of random unit vectors is built in
+a temp directory. Each mode starts --processes fresh processes that load
+the index and run one query while all of them hold it, reporting per
+process: load time, first-query latency, private (anonymous) RSS, mapped
+file RSS and PSS, where shared pages are split between the processes
+mapping them. --drop-caches (root only) empties the page cache before each
+mode so the first query includes reading the file from disk.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import faiss
+from app.services.vector import read_index_file, vector_service
+
+
+def memory_mb() -> dict:
+    """Resident memory split from /proc, in MB"""
+    fields = {}
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                name, value = line.split(":")
+                fields[name] = int(value.split()[0]) / 1024
+    with open("/proc/self/smaps_rollup") as rollup:
+        for line in rollup:
+            if line.startswith("Pss:"):
+                fields["Pss"] = int(line.split()[1]) / 1024
+    return fields
+
+
+def load_and_query(path: str, mmap: bool, query: np.ndarray, barrier, results):
+    before = memory_mb()
+    start = time.perf_counter()
+    index = read_index_file(path, mmap)
+    loaded = time.perf_counter()
+    index.search(query, 10)
+    queried = time.perf_counter()
+    barrier.wait()  # Every process holds the index before memory is read
+    after = memory_mb()
+    barrier.wait()
+    results.put({
+        "load_ms": (loaded - start) * 1000,
+        "first_query_ms": (queried - loaded) * 1000,
+        "anon_mb": after["RssAnon"] - before["RssAnon"],
+        "file_mb": after["RssFile"] - before["RssFile"],
+        "pss_mb": after["Pss"] - before["Pss"]
+    })
+
+
+def run(path: str, mmap: bool, processes: int, query: np.ndarray) -> list:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [
+        context.Process(target=load_and_query, args=(path, mmap, query, barrier, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    samples = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return samples
+
+
+def build_index(path: str, vectors: int, dimension: int):
+    rng = np.random.default_rng(0)
+    index = vector_service.new_index()
+    for start in range(0, vectors, 10000):
+        batch = rng.standard_normal((min(10000, vectors - start), dimension), dtype=np.float32)
+        faiss.normalize_L2(batch)
+        vector_service.add_embeddings(index, batch)
+    faiss.write_index(index, path)
+
+
+def drop_caches():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as caches:
+        caches.write("3\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("index", nargs="?", help="Existing index.faiss to load")
+    parser.add_argument("--vectors", type=int, default=100000, help="Size of the synthetic index")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--drop-caches", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = args.index
+        if path is None:
+            path = os.path.join(scratch, "index.faiss")
+            print(f"Building a {args.vectors}-vector HNSW index")
+            build_index(path, args.vectors, vector_service.dimension)
+
+        dimension = read_index_file(path, mmap=True).d
+        query = np.random.default_rng(1).standard_normal((1, dimension), dtype=np.float32)
+        faiss.normalize_L2(query)
+
+        print(f"{path}: {os.path.getsize(path) / (1024 * 1024):.1f} MB, {args.processes} processes")
+        print(f"{'mode':>6}  {'load ms':>8}  {'query ms':>8}  {'anon MB':>8}  {'file MB':>8}  {'PSS MB':>8}")
+        for mode, mmap in (("copy", False), ("mmap", True)):
+            if args.drop_caches:
+                drop_caches()
+            samples = run(path, mmap, args.processes, query)
+            mean = {name: sum(sample[name] for sample in samples) / len(samples) for name in samples[0]}
+            print(f"{mode:>6}  {mean['load_ms']:>8.1f}  {mean['first_query_ms']:>8.2f}  {mean['anon_mb']:>8.1f}  "
+                  f"{mean['file_mb']:>8.1f}  {mean['pss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
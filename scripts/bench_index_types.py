@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compare the index types VectorService can build: recall@k against exact
+search, serialized bytes per vector, build time and single-query latency.
+
+Usage:
+  python scripts/bench_index_types.py --embeddings chunks.npy [--k 10]
+  python scripts/bench_index_types.py --vectors 50000 [--types hnsw_flat ivf_pq]
+
+--embeddings takes an (n, 1024) float32 .npy of real chunk embeddings;
+queries are then held-out rows. Without it, unit vectors are drawn around
+random cluster centres, which is kinder to quantization than uniform noise
+but still no substitute for real embeddings. Each type is built with the
+real VectorService.build_index and the current INDEX_* settings.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import faiss
+from app.services.vector import INDEX_TYPES, vector_service
+
+
+def synthetic_vectors(count: int, dimension: int, clusters: int = 256) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, count)]
+    vectors += 0.6 * rng.standard_normal((count, dimension), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)]))
+
+
+def bench_type(index_type: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    start = time.perf_counter()
+    index, meta = vector_service.build_index(vectors, index_type)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+
+    return {
+        "type": index_type,
+        "built_as": meta["type"],
+        "params": meta["params"],
+        f"recall@{k}": round(recall_at_k(found, truth), 4),
+        "bytes_per_vector": round(len(faiss.serialize_index(index)) / len(vectors), 1),
+        "build_seconds": round(build_seconds, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", help=".npy of chunk embeddings")
+    parser.add_argument("--vectors", type=int, default=50000, help="Size of the synthetic set")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES + ("auto",))
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        data = np.ascontiguousarray(np.load(args.embeddings), dtype=np.float32)
+    else:
+        data = synthetic_vectors(args.vectors + args.queries, vector_service.dimension)
+    vectors, queries = data[:-args.queries], data[-args.queries:]
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    if not args.json:
+        print(f"{len(vectors)} vectors, {len(queries)} queries, k={args.k}")
+        print(f"{'type':>10}  {'built as':>10}  {'recall':>7}  {'B/vec':>8}  {'build s':>8}  {'p50 ms':>7}  {'p99 ms':>7}")
+    for index_type in args.types:
+        result = bench_type(index_type, vectors, queries, truth, args.k)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{result['type']:>10}  {result['built_as']:>10}  {result[f'recall@{args.k}']:>7.3f}  "
+                  f"{result['bytes_per_vector']:>8.1f}  {result['build_seconds']:>8.2f}  "
+                  f"{result['p50_ms']:>7.3f}  {result['p99_ms']:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compare fetching a PDF from object storage via a temp file against
+streaming it into shared memory, up to an opened PyMuPDF document.
+
+Usage:
+  python scripts/bench_pdf_fetch.py path/to/book.pdf [--repeat 3]
+  python scripts/bench_pdf_fetch.py --object-key user/doc/book.pdf
+
+A local PDF is uploaded under bench/ first and deleted afterwards. Each
+mode runs the worker's real fetch_pdf path (download, sha256, open, page
+count); timings are wall-clock seconds and MB/s.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+from app.core.config import settings
+from app.services.storage import storage_service
+from extraction import count_pages
+from tasks import fetch_pdf
+
+
+def run(object_key: str, streaming: bool) -> float:
+    settings.INGEST_STREAMING = streaming
+    start = time.perf_counter()
+    with fetch_pdf(object_key) as (source, content_hash):
+        count_pages(source)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="Local PDF to upload and fetch")
+    parser.add_argument("--object-key", help="Existing object to fetch instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if not args.pdf and not args.object_key:
+        parser.error("give a PDF path or --object-key")
+    
+    object_key = args.object_key
+    if args.pdf:
+        object_key = f"bench/{uuid.uuid4()}/{os.path.basename(args.pdf)}"
+        storage_service.upload_file(args.pdf, object_key)
+    
+    try:
+        size_mb = storage_service.get_object_size(object_key) / (1024 * 1024)
+        print(f"{object_key}: {size_mb:.1f} MB, {settings.STORAGE_DOWNLOAD_THREADS} threads, "
+              f"{settings.STORAGE_PART_SIZE_MB} MB parts")
+        print(f"{'mode':>10}  {'best s':>8}  {'mean s':>8}  {'MB/s':>8}")
+        for mode, streaming in (("tempfile", False), ("streaming", True)):
+            times = [run(object_key, streaming) for _ in range(args.repeat)]
+            best = min(times)
+            print(f"{mode:>10}  {best:>8.2f}  {sum(times) / len(times):>8.2f}  {size_mb / best:>8.1f}")
+    finally:
+        if args.pdf:
+            storage_service.delete_object(object_key)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval quality and latency benchmark, to judge retrieval changes
+before they ship.
+
+Usage:
+  python scripts/bench_retrieval.py [--books 2] [--pages 150] [--questions 200]
+                                    [--configs flat hnsw_flat flat+bm25 ...] [--k 1 5 10]
+                                    [--work-dir DIR] [--json]
+
+Synthetic textbooks are generated as PDFs: every page states a few facts
+("The yield strength of Corvane alloy is 412 MPa ...") drawn from a pool
+of made-up subjects and properties, so each subject and each property
+recurs across many pages and only the pair identifies the answer page.
+Questions paraphrase one fact each, so the page that answers them is known.
+Each book then goes through the production path: extract_pages, chunk_text
+per page, VectorService.create_index and VectorService.search, with the
+BGE-M3 model and the current settings.
+
+A config is an index type (INDEX_TYPE, including auto), optionally with
+"+bm25" for hybrid retrieval (ENABLE_BM25). Per config it reports recall@k
+(share of questions with a chunk from the answer page in the top k), MRR
+(over the largest k), build seconds, index bytes (FAISS and BM25 files)
+and p50/p99 search latency. Chunks and questions are embedded once up
+front, so build time and latency exclude the model; the embedding time is
+reported separately. --json prints one JSON object per config.
+
+Indexes are written under --work-dir (a temporary directory by default,
+removed afterwards); the embedding cache lives there too, so a kept
+--work-dir makes repeated runs skip the model.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'worker'))
+
+import fitz  # PyMuPDF
+from app.core.config import settings
+from app.services.vector import INDEX_TYPES, EmbeddingCache, QueryEmbeddingCache, embedding_namespace, vector_service
+from chunking import chunk_text
+from extraction import extract_pages
+
+# (unit, typical magnitude, phrasings used in questions)
+PROPERTIES = {
+    "yield strength": ("MPa", 400, ["stress at which {subject} starts to yield", "yield strength of {subject}"]),
+    "elastic modulus": ("GPa", 150, ["stiffness of {subject} in the elastic range", "Young's modulus of {subject}"]),
+    "Poisson's ratio": ("", 0.3, ["ratio of lateral to axial strain for {subject}", "Poisson's ratio of {subject}"]),
+    "thermal conductivity": ("W/mK", 50, ["how well {subject} conducts heat", "thermal conductivity of {subject}"]),
+    "density": ("kg/m3", 5000, ["mass per unit volume of {subject}", "density of {subject}"]),
+    "fracture toughness": ("MPa m^0.5", 40, ["resistance of {subject} to crack growth", "fracture toughness of {subject}"]),
+    "melting point": ("C", 1200, ["temperature at which {subject} melts", "melting point of {subject}"]),
+    "fatigue limit": ("MPa", 200, ["stress amplitude {subject} survives indefinitely", "endurance limit of {subject}"]),
+    "hardness": ("HV", 250, ["resistance of {subject} to indentation", "Vickers hardness of {subject}"]),
+    "thermal expansion coefficient": ("1e-6/K", 12, ["how much {subject} expands when heated", "coefficient of thermal expansion of {subject}"]),
+    "shear modulus": ("GPa", 60, ["rigidity of {subject} under shear", "shear modulus of {subject}"]),
+    "creep rate": ("1e-8/s", 5, ["rate at which {subject} slowly deforms under constant load", "creep rate of {subject}"]),
+}
+QUESTION_TEMPLATES = (
+    "What is the {phrase}?",
+    "According to the text, what value is given for the {phrase}?",
+    "How large is the {phrase}?",
+)
+SUBJECT_KINDS = ("alloy", "steel", "polymer", "composite", "ceramic", "bronze")
+SYLLABLES = ("cor", "van", "mel", "trix", "hal", "dor", "ves", "kel", "mar", "ton", "zir", "lo", "pra", "sen", "ul", "quin")
+CONDITIONS = (
+    "at room temperature", "after annealing", "in the rolling direction", "under quasi-static loading",
+    "after cold work", "in the as-cast condition", "at elevated temperature", "after solution treatment"
+)
+FILLER = (
+    "Stress is defined as the internal force per unit area acting on a cross-section.",
+    "Strain measures the relative deformation of a body under load.",
+    "Within the proportional limit, stress and strain are linearly related.",
+    "Engineers apply a factor of safety to account for uncertainty in loads and material data.",
+    "Test specimens are machined to standard dimensions before loading.",
+    "The results depend strongly on temperature, loading rate and processing history.",
+    "Tabulated values should be treated as typical rather than guaranteed minimums.",
+    "Microstructure controls most of the mechanical behaviour discussed in this chapter.",
+    "Designers compare candidate materials using property charts and performance indices.",
+    "The example below works through the calculation step by step.",
+    "Measurements were repeated on several specimens and averaged.",
+    "Compare this value with the figures reported in the previous section.",
+)
+
+
+def make_subjects(rng: random.Random, count: int) -> list:
+    subjects = set()
+    while len(subjects) < count:
+        name = "".join(rng.sample(SYLLABLES, rng.randint(2, 3))).capitalize()
+        subjects.add(f"{name} {rng.choice(SUBJECT_KINDS)}")
+    return sorted(subjects)
+
+
+def make_book(seed: int, page_total: int, facts_per_page: int = 3):
+    """
+    Page texts and facts for one synthetic textbook. Every (subject,
+    property) pair is stated on exactly one page.
+    """
+    rng = random.Random(seed)
+    properties = list(PROPERTIES)
+    subjects = make_subjects(rng, max(4, page_total * facts_per_page // 8 + 1))
+    pairs = [(subject, prop) for subject in subjects for prop in properties]
+    rng.shuffle(pairs)
+
+    pages, facts = [], []
+    for page_number in range(1, page_total + 1):
+        page_pairs = pairs[(page_number - 1) * facts_per_page:page_number * facts_per_page]
+        chapter, section = (page_number - 1) // 20 + 1, (page_number - 1) % 20 + 1
+        paragraphs = [f"{chapter}.{section} Properties of {page_pairs[0][0]}"]
+        for subject, prop in page_pairs:
+            unit, magnitude, phrases = PROPERTIES[prop]
+            value = round(magnitude * rng.uniform(0.5, 1.5), 2 if magnitude < 1 else 0 if magnitude > 20 else 1)
+            other = rng.choice(subjects)
+            sentences = [
+                f"The {prop} of {subject} is {value:g} {unit}".rstrip() + f" {rng.choice(CONDITIONS)}.",
+                f"By comparison, {other} behaves differently under the same conditions."
+            ] + rng.sample(FILLER, 3)
+            paragraphs.append(" ".join(sentences))
+            facts.append({"page": page_number, "subject": subject, "property": prop, "phrases": phrases})
+        paragraphs.append(" ".join(rng.sample(FILLER, 4)))
+        pages.append("\n\n".join(paragraphs))
+    return pages, facts
+
+
+def make_questions(seed: int, facts: list, count: int) -> list:
+    rng = random.Random(seed + 1)
+    questions = []
+    for fact in rng.sample(facts, min(count, len(facts))):
+        phrase = rng.choice(fact["phrases"]).format(subject=fact["subject"])
+        questions.append({"question": rng.choice(QUESTION_TEMPLATES).format(phrase=phrase), "page": fact["page"]})
+    return questions
+
+
+def write_pdf(path: str, pages: list):
+    pdf_doc = fitz.open()
+    for text in pages:
+        page = pdf_doc.new_page()
+        if page.insert_textbox(fitz.Rect(54, 54, 558, 738), text, fontsize=10) < 0:
+            raise ValueError("Synthetic page text does not fit on one PDF page")
+    pdf_doc.save(path)
+    pdf_doc.close()
+
+
+def load_book(pdf_path: str):
+    """Chunk texts and the page of each chunk, through the ingestion extraction and chunking"""
+    texts, chunk_pages = [], []
+    for page_number, text in extract_pages(pdf_path):
+        for chunk in chunk_text(text, page_number, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP):
+            texts.append(chunk["text"])
+            chunk_pages.append(page_number)
+    return texts, chunk_pages
+
+
+def bench_config(config: str, books: list, ks: list) -> dict:
+    index_type, _, mode = config.partition("+")
+    settings.INDEX_TYPE = index_type
+    settings.ENABLE_BM25 = mode == "bm25"
+    top_k = max(ks)
+    user_id = "bench"
+
+    build_seconds, index_bytes, lexical_bytes, built_as = 0.0, 0, 0, set()
+    latencies, hits, reciprocal_ranks = [], {k: 0 for k in ks}, []
+    for book in books:
+        doc_id = f"{book['name']}-{config.replace('+', '-')}"
+        start = time.perf_counter()
+        vector_service.create_index(user_id, doc_id, book["texts"])
+        build_seconds += time.perf_counter() - start
+
+        index_dir = vector_service.get_index_dir(user_id, doc_id)
+        index_bytes += os.path.getsize(vector_service._get_index_path(user_id, doc_id))
+        if os.path.exists(vector_service._get_lexical_path(user_id, doc_id)):
+            lexical_bytes += os.path.getsize(vector_service._get_lexical_path(user_id, doc_id))
+        with open(os.path.join(index_dir, "index.json")) as f:
+            built_as.add(json.load(f)["type"])
+
+        vector_service.search(user_id, doc_id, book["questions"][0]["question"], top_k)  # Loads the index
+        for question in book["questions"]:
+            start = time.perf_counter()
+            results = vector_service.search(user_id, doc_id, question["question"], top_k)
+            latencies.append(time.perf_counter() - start)
+
+            ranked_pages = [book["chunk_pages"][vector_id] for vector_id, _ in results]
+            rank = ranked_pages.index(question["page"]) + 1 if question["page"] in ranked_pages else None
+            reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+            for k in ks:
+                hits[k] += bool(rank and rank <= k)
+        vector_service.index_cache.invalidate(f"{user_id}/{doc_id}")
+
+    question_total = len(reciprocal_ranks)
+    result = {"config": config, "built_as": ",".join(sorted(built_as))}
+    result.update({f"recall@{k}": round(hits[k] / question_total, 4) for k in ks})
+    result.update({
+        f"mrr@{top_k}": round(float(np.mean(reciprocal_ranks)), 4),
+        "build_seconds": round(build_seconds, 3),
+        "index_bytes": index_bytes,
+        "bm25_bytes": lexical_bytes,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        "chunks": sum(len(book["texts"]) for book in books),
+        "questions": question_total
+    })
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=150, help="Pages per book")
+    parser.add_argument("--questions", type=int, default=200, help="Questions per book")
+    parser.add_argument("--configs", nargs="+",
+                        default=["flat", "hnsw_flat", "hnsw_sq8", "hnsw_fp16", "ivf_pq", "auto", "flat+bm25", "auto+bm25"],
+                        help="Index types (or auto), each optionally suffixed +bm25 for hybrid retrieval")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Keep indexes and the embedding cache here (default: a temporary directory)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench-retrieval-")
+    # Everything stays in the work directory and this process: local indexes,
+    # a private embedding cache and an in-process query cache
+    settings.FAISS_DATA_DIR = os.path.join(work_dir, "faiss")
+    settings.INDEX_REMOTE_ENABLED = False
+    vector_service.disk_cache = None
+    vector_service.embedding_cache = EmbeddingCache(
+        os.path.join(work_dir, "embedding_cache"),
+        vector_service.dimension,
+        settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+    )
+    vector_service.query_cache = QueryEmbeddingCache(embedding_namespace(), 1_000_000, 86400)
+
+    for config in args.configs:
+        index_type, _, mode = config.partition("+")
+        if index_type not in INDEX_TYPES + ("auto",) or mode not in ("", "bm25"):
+            parser.error(f"Unknown config {config!r}")
+
+    try:
+        books = []
+        embed_seconds = 0.0
+        for book_number in range(args.books):
+            seed = args.seed + book_number
+            pages, facts = make_book(seed, args.pages)
+            pdf_path = os.path.join(work_dir, f"book-{seed}.pdf")
+            write_pdf(pdf_path, pages)
+            texts, chunk_pages = load_book(pdf_path)
+            questions = make_questions(seed, facts, args.questions)
+
+            start = time.perf_counter()
+            vector_service.embed_documents(texts)  # Fills the embedding cache for every config
+            for question in questions:
+                vector_service.embed_query(question["question"])
+            embed_seconds += time.perf_counter() - start
+            books.append({"name": f"book-{seed}", "texts": texts, "chunk_pages": chunk_pages, "questions": questions})
+
+        chunk_total = sum(len(book["texts"]) for book in books)
+        question_total = sum(len(book["questions"]) for book in books)
+        if not args.json:
+            print(f"{args.books} books x {args.pages} pages: {chunk_total} chunks, {question_total} questions; "
+                  f"embedding took {embed_seconds:.1f}s (excluded below)")
+            recall_headers = "".join(f"  {f'R@{k}':>6}" for k in args.k)
+            print(f"{'config':>16}  {'built as':>10}{recall_headers}  {'MRR':>6}  {'build s':>8}  "
+                  f"{'index KB':>9}  {'bm25 KB':>8}  {'p50 ms':>7}  {'p99 ms':>7}")
+        for config in args.configs:
+            result = bench_config(config, books, args.k)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                recalls = "".join(f"  {result[f'recall@{k}']:>6.3f}" for k in args.k)
+                print(f"{result['config']:>16}  {result['built_as']:>10}{recalls}  "
+                      f"{result[f'mrr@{max(args.k)}']:>6.3f}  {result['build_seconds']:>8.2f}  "
+                      f"{result['index_bytes'] / 1024:>9.1f}  {result['bm25_bytes'] / 1024:>8.1f}  "
+                      f"{result['p50_ms']:>7.3f}  {result['p99_ms']:>7.3f}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Export the embedding model's transformer to ONNX for EMBEDDING_BACKEND=onnx.
+
+Usage:
+  python scripts/export_onnx.py /models/bge-m3-onnx [--model BAAI/bge-m3] [--int8]
+
+Writes model.onnx (BGE-M3's weights exceed protobuf's 2 GB limit, so torch
+stores them as external data beside it), the tokenizer files, and
+embedding.json with the pooling mode and max sequence length of the
+sentence-transformers model. --int8 also writes model.int8.onnx with ONNX
+Runtime dynamic quantization and points embedding.json at it.
+"""
+import argparse
+import json
+import os
+import sys
+
+import torch
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Pooling
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from app.core.config import settings
+
+
+class LastHiddenState(torch.nn.Module):
+    """Token embeddings only; pooling and normalization happen in the backend"""
+
+    def __init__(self, transformer):
+        super().__init__()
+        self.transformer = transformer
+
+    def forward(self, input_ids, attention_mask):
+        return self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--model", default=settings.BGE_M3_MODEL_PATH)
+    parser.add_argument("--int8", action="store_true", help="Also write a dynamically quantized model")
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model, device="cpu")
+    pooling = next(module for module in model if isinstance(module, Pooling))
+    transformer = model[0].auto_model.eval()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    model_path = os.path.join(args.output_dir, "model.onnx")
+    sample = model.tokenizer(["export sample"], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+    print(f"Exporting {args.model} to {model_path}")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer),
+            (sample["input_ids"], sample["attention_mask"]),
+            model_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+            opset_version=17
+        )
+    model.tokenizer.save_pretrained(args.output_dir)
+
+    model_file = "model.onnx"
+    if args.int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        model_file = "model.int8.onnx"
+        print(f"Quantizing to {model_file}")
+        quantize_dynamic(
+            model_path,
+            os.path.join(args.output_dir, model_file),
+            weight_type=QuantType.QInt8,
+            use_external_data_format=True
+        )
+
+    config = {
+        "source_model": args.model,
+        "model_file": model_file,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension()
+    }
+    with open(os.path.join(args.output_dir, "embedding.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    print(json.dumps(config))
+
+
+if __name__ == "__main__":
+    main()
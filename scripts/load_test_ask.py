@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Load-test /api/ask and report time-to-first-token and stream stalls.
+
+Usage:
+  python scripts/load_test_ask.py --token JWT --chat-id CHAT [--base-url http://localhost:8000]
+                                  [--concurrency 16] [--requests 200] [--questions questions.txt]
+                                  [--label inline] [--json]
+
+Each of --concurrency threads posts questions (one per line of
+--questions, cycled; default a built-in set) and reads the SSE stream to
+the end. Per request it records time to the first token event and the
+longest gap between consecutive events, which is where a blocked event
+loop shows up for streams that were already flowing. Every question is
+stored as a message in the chat, so use a throwaway chat.
+
+To compare retrieval on the event loop with the retrieval executor, run
+once against an API started with RETRIEVAL_MAX_CONCURRENCY=0 and once with
+the default, giving each run a --label. Vary the questions (or disable
+QUERY_CACHE_ENABLED) so query embedding is not served from cache.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_QUESTIONS = [
+    "What is the definition of stress?",
+    "How is Young's modulus measured?",
+    "Explain the difference between elastic and plastic deformation.",
+    "What causes fatigue failure in metals?",
+    "How do you calculate the deflection of a cantilever beam?",
+    "What is Poisson's ratio?",
+    "When does a column buckle?",
+    "Summarize the assumptions of beam bending theory."
+]
+
+
+def ask(base_url: str, token: str, chat_id: str, question: str) -> dict:
+    request = urllib.request.Request(
+        f"{base_url}/api/ask",
+        data=json.dumps({"chat_id": chat_id, "question": question}).encode(),
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        method="POST"
+    )
+    start = time.perf_counter()
+    first_token = None
+    last_event = start
+    max_gap = 0.0
+    error = None
+    with urllib.request.urlopen(request, timeout=120) as response:
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            now = time.perf_counter()
+            if first_token is not None:
+                max_gap = max(max_gap, now - last_event)
+            last_event = now
+            event = json.loads(line[len("data:"):])
+            if event.get("type") == "token" and first_token is None:
+                first_token = now - start
+            elif event.get("type") == "error":
+                error = event.get("error")
+    return {"ttft": first_token, "max_gap": max_gap, "total": time.perf_counter() - start, "error": error}
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--chat-id", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--questions")
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    results = []
+    lock = threading.Lock()
+
+    def worker(i: int):
+        try:
+            result = ask(args.base_url, args.token, args.chat_id, questions[i % len(questions)])
+        except Exception as e:
+            result = {"ttft": None, "max_gap": None, "total": None, "error": str(e)}
+        with lock:
+            results.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    ttfts = [r["ttft"] for r in results if r["ttft"] is not None]
+    gaps = [r["max_gap"] for r in results if r["max_gap"] is not None and r["ttft"] is not None]
+    summary = {
+        "label": args.label,
+        "requests": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "concurrency": args.concurrency,
+        "requests_per_second": round(len(results) / elapsed, 2),
+        "ttft_p50_seconds": percentile(ttfts, 0.50),
+        "ttft_p95_seconds": percentile(ttfts, 0.95),
+        "ttft_p99_seconds": percentile(ttfts, 0.99),
+        "stream_gap_p99_seconds": percentile(gaps, 0.99)
+    }
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"{summary['label']}: {summary['requests']} requests, {summary['errors']} errors, "
+          f"concurrency {args.concurrency}, {summary['requests_per_second']} req/s")
+    for name in ("ttft_p50_seconds", "ttft_p95_seconds", "ttft_p99_seconds", "stream_gap_p99_seconds"):
+        value = summary[name]
+        print(f"  {name:<24} {value:.3f}" if value is not None else f"  {name:<24} -")
+
+
+if __name__ == "__main__":
+    main()
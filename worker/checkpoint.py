@@ -0,0 +1,77 @@
+"""
+Ingestion checkpoints
+After each committed batch the worker appends that batch's embeddings to a
+raw float32 vectors file and atomically rewrites checkpoint.json. A retried
+job reloads the vectors up to the checkpoint, discards any rows or vectors
+written after it, and resumes extraction from the next page.
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+
+class IngestCheckpoint:
+    STATE_FILENAME = "checkpoint.json"
+    VECTORS_FILENAME = "vectors.partial"
+    
+    def __init__(self, directory: str, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+        self.state_path = os.path.join(directory, self.STATE_FILENAME)
+        self.vectors_path = os.path.join(directory, self.VECTORS_FILENAME)
+    
+    @staticmethod
+    def initial_state() -> Dict[str, Any]:
+        return {"last_page": 0, "page_count": 0, "chunk_count": 0, "ntotal": 0}
+    
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the last committed state, or None if there is no usable checkpoint"""
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        row_bytes = self.dimension * 4
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if vector_bytes < state["ntotal"] * row_bytes:
+            # Vectors file is missing data the checkpoint claims; start over
+            return None
+        
+        # Drop vectors appended after the checkpoint was last written
+        if vector_bytes > state["ntotal"] * row_bytes:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(state["ntotal"] * row_bytes)
+        return state
+    
+    def iter_vectors(self, ntotal: int, batch_size: int = 4096) -> Iterator[np.ndarray]:
+        """Yield the first ntotal checkpointed vectors in slices, without loading them all"""
+        if ntotal == 0:
+            return
+        vectors = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(ntotal, self.dimension))
+        for start in range(0, ntotal, batch_size):
+            yield np.array(vectors[start:start + batch_size])
+        del vectors
+    
+    def commit(self, embeddings: Optional[np.ndarray], state: Dict[str, Any]):
+        """Durably append a batch's vectors, then record the new state"""
+        os.makedirs(self.directory, exist_ok=True)
+        if embeddings is not None and len(embeddings):
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(embeddings, dtype="float32").tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+    
+    def clear(self):
+        for path in (self.state_path, self.vectors_path):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,255 @@
+"""
+Chunking strategies
+Each strategy segments page text into units (paragraphs or sentences) in a
+single regex pass and packs consecutive units into chunks under a size
+budget, measured in characters or in embedding-tokenizer tokens.
+
+Offsets always index the page text: for a chunk that stays on one page,
+page_text[char_start:char_end] == chunk["text"]. The cross-page strategy
+may carry a chunk over a page break; such a chunk belongs to the page it
+starts on and its char_end is clamped to the end of that page.
+"""
+import re
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Tuple
+
+STRATEGIES = ("paragraph", "sentence", "token", "cross_page")
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t\r\f\v]*\n")
+# Group 1 is the sentence-final punctuation, kept with the sentence
+SENTENCE_BREAK = re.compile(r"([.!?]+[\"')\]]*)\s+|\n[ \t\r\f\v]*\n")
+
+Span = Tuple[int, int]
+
+
+def paragraph_spans(text: str) -> List[Span]:
+    """Paragraphs separated by blank lines, with surrounding whitespace trimmed"""
+    spans = []
+    pos = 0
+    for match in PARAGRAPH_BREAK.finditer(text):
+        _add_span(text, pos, match.start(), spans)
+        pos = match.end()
+    _add_span(text, pos, len(text), spans)
+    return spans
+
+
+def sentence_spans(text: str) -> List[Span]:
+    """Sentences ending in . ! or ? followed by whitespace, plus paragraph breaks"""
+    spans = []
+    pos = 0
+    for match in SENTENCE_BREAK.finditer(text):
+        end = match.end(1) if match.group(1) else match.start()
+        _add_span(text, pos, end, spans)
+        pos = match.end()
+    _add_span(text, pos, len(text), spans)
+    return spans
+
+
+def _add_span(text: str, start: int, end: int, spans: List[Span]):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        spans.append((start, end))
+
+
+class CharMeasure:
+    """Unit size in characters; oversized units are split at whitespace"""
+    
+    def __init__(self, text: str):
+        self.text = text
+    
+    def size(self, start: int, end: int) -> int:
+        return end - start
+    
+    def split(self, start: int, end: int, budget: int) -> List[Span]:
+        spans = []
+        while end - start > budget:
+            cut = max(self.text.rfind(" ", start, start + budget), self.text.rfind("\n", start, start + budget))
+            if cut <= start:
+                cut = start + budget  # No whitespace to break on
+            _add_span(self.text, start, cut, spans)
+            start = cut
+        _add_span(self.text, start, end, spans)
+        return spans
+
+
+class TokenMeasure:
+    """
+    Unit size in embedding-tokenizer tokens. The page is tokenized once
+    with offsets; a unit's size is the number of tokens starting inside it.
+    """
+    
+    def __init__(self, text: str, tokenizer):
+        encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        self.text = text
+        self.starts = [start for start, end in encoding["offset_mapping"]]
+        self.ends = [end for start, end in encoding["offset_mapping"]]
+    
+    def size(self, start: int, end: int) -> int:
+        return bisect_left(self.starts, end) - bisect_left(self.starts, start)
+    
+    def split(self, start: int, end: int, budget: int) -> List[Span]:
+        first, last = bisect_left(self.starts, start), bisect_left(self.starts, end)
+        spans = []
+        for i in range(first, last, budget):
+            window_end = end if i + budget >= last else self.starts[i + budget]
+            _add_span(self.text, max(start, self.starts[i]), window_end, spans)
+        return spans or [(start, end)]
+
+
+def pack(spans: List[Span], measure, budget: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Greedily group consecutive spans into chunks whose extent (separators
+    included) is at most `budget`, each chunk after the first repeating up
+    to `overlap` worth of trailing spans from its predecessor. Returns
+    (first, stop) index ranges into spans. Oversized spans must already
+    have been split.
+    """
+    ranges = []
+    first = 0
+    for i in range(len(spans)):
+        if i > first and measure.size(spans[first][0], spans[i][1]) > budget:
+            ranges.append((first, i))
+            # Back up over trailing spans for overlap, always advancing past `first`
+            new_first = i
+            while (new_first - 1 > first
+                   and measure.size(spans[new_first - 1][0], spans[i - 1][1]) <= overlap
+                   and measure.size(spans[new_first - 1][0], spans[i][1]) <= budget):
+                new_first -= 1
+            first = new_first
+    if first < len(spans):
+        ranges.append((first, len(spans)))
+    return ranges
+
+
+def split_oversized(spans: List[Span], measure, budget: int) -> List[Span]:
+    result = []
+    for start, end in spans:
+        if measure.size(start, end) > budget:
+            result.extend(measure.split(start, end, budget))
+        else:
+            result.append((start, end))
+    return result
+
+
+class PageChunker:
+    """Chunks each page independently"""
+    
+    def __init__(self, segment: Callable[[str], List[Span]], make_measure: Callable[[str], Any],
+                 budget: int, overlap: int):
+        self.segment = segment
+        self.make_measure = make_measure
+        self.budget = budget
+        self.overlap = overlap
+    
+    def chunk_page(self, text: str) -> List[Dict[str, Any]]:
+        measure = self.make_measure(text)
+        spans = split_oversized(self.segment(text), measure, self.budget)
+        return [
+            {
+                "text": text[spans[first][0]:spans[stop - 1][1]],
+                "char_start": spans[first][0],
+                "char_end": spans[stop - 1][1]
+            }
+            for first, stop in pack(spans, measure, self.budget, self.overlap)
+        ]
+    
+    def feed(self, page_number: int, text: str) -> List[Dict[str, Any]]:
+        return [{"page_number": page_number, **chunk} for chunk in self.chunk_page(text)]
+    
+    def flush(self) -> List[Dict[str, Any]]:
+        return []
+
+
+class CrossPageChunker:
+    """
+    Packs paragraphs across page breaks so short page tails and heads are
+    merged instead of becoming tiny chunks. Works on a rolling buffer of
+    pages: spans carry document-global offsets, and only the trailing,
+    still-growing chunk's spans and pages are kept between feeds.
+    """
+    
+    def __init__(self, budget: int, overlap: int):
+        self.budget = budget
+        self.overlap = overlap
+        self.pages = []  # (page_number, text, global offset), oldest first
+        self.spans: List[Span] = []  # Pending spans, global offsets
+        self.next_offset = 0
+    
+    def feed(self, page_number: int, text: str) -> List[Dict[str, Any]]:
+        offset = self.next_offset
+        self.pages.append((page_number, text, offset))
+        self.next_offset += len(text)
+        page_spans = split_oversized(paragraph_spans(text), CharMeasure(text), self.budget)
+        self.spans.extend((offset + start, offset + end) for start, end in page_spans)
+        return self._emit(final=False)
+    
+    def flush(self) -> List[Dict[str, Any]]:
+        return self._emit(final=True)
+    
+    def _emit(self, final: bool) -> List[Dict[str, Any]]:
+        ranges = pack(self.spans, _GlobalMeasure(), self.budget, self.overlap)
+        if not final and ranges:
+            keep_from = ranges[-1][0]
+            ranges = ranges[:-1]  # The last chunk may still grow on the next page
+        else:
+            keep_from = len(self.spans)
+        
+        chunks = [self._make_chunk(self.spans[first][0], self.spans[stop - 1][1]) for first, stop in ranges]
+        self.spans = self.spans[keep_from:]
+        
+        # Drop pages nothing pending refers to any more
+        horizon = self.spans[0][0] if self.spans else self.next_offset
+        while self.pages and self.pages[0][2] + len(self.pages[0][1]) <= horizon:
+            self.pages.pop(0)
+        return chunks
+    
+    def _make_chunk(self, start: int, end: int) -> Dict[str, Any]:
+        parts = []
+        owner = None
+        for page_number, text, offset in self.pages:
+            page_end = offset + len(text)
+            if page_end <= start or offset >= end:
+                continue
+            if owner is None:
+                owner = (page_number, start - offset, min(end, page_end) - offset)
+            parts.append(text[max(start, offset) - offset:min(end, page_end) - offset])
+        page_number, char_start, char_end = owner
+        return {
+            "page_number": page_number,
+            "text": "".join(parts),
+            "char_start": char_start,
+            "char_end": char_end
+        }
+
+
+class _GlobalMeasure:
+    """Character measure over spans that are already within budget"""
+    
+    def size(self, start: int, end: int) -> int:
+        return end - start
+
+
+def make_chunker(strategy: str, budget: int, overlap: int, tokenizer=None):
+    """Build a chunker with feed(page_number, text) / flush() for a strategy name"""
+    if strategy == "paragraph":
+        return PageChunker(paragraph_spans, CharMeasure, budget, overlap)
+    if strategy == "sentence":
+        return PageChunker(sentence_spans, CharMeasure, budget, overlap)
+    if strategy == "token":
+        if tokenizer is None:
+            raise ValueError("The token chunking strategy needs the embedding tokenizer")
+        return PageChunker(sentence_spans, lambda text: TokenMeasure(text, tokenizer), budget, overlap)
+    if strategy == "cross_page":
+        return CrossPageChunker(budget, overlap)
+    raise ValueError(f"Unknown chunking strategy {strategy!r}; expected one of {', '.join(STRATEGIES)}")
+
+
+def chunk_text(text: str, page_number: int, chunk_size: int = 600, overlap: int = 80):
+    """
+    Chunk one page into overlapping paragraph-packed segments.
+    Offsets are exact: text[char_start:char_end] == chunk["text"].
+    """
+    return PageChunker(paragraph_spans, CharMeasure, chunk_size, overlap).chunk_page(text)
@@ -0,0 +1,185 @@
+"""
+PDF text extraction
+Yields (page_number, text) pairs in page order, either from a single
+PyMuPDF document or from a process pool working on page-range shards.
+A PDF source is a file path or a SharedPdf: bytes streamed from object
+storage into a named shared-memory block, which pool processes open by
+its /dev/shm path instead of reading a scratch file.
+Kept free of app imports so scripts and tests can use it without the
+backend. Pool processes are spawned, so each re-imports the worker's
+__main__ (worker.py, and through it tasks, the app, torch and
+sentence-transformers) before its first shard. The resident worker pays
+that once by keeping a pool for its lifetime (start_pool); other callers
+get a pool per PDF, which is why small PDFs skip it
+(PARALLEL_EXTRACT_MIN_PAGES).
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import NamedTuple, Union
+
+import fitz  # PyMuPDF
+
+
+class SharedPdf(NamedTuple):
+    """A PDF held in a named shared-memory block"""
+    name: str
+    size: int
+
+
+PdfSource = Union[str, SharedPdf]
+
+# Pool kept across jobs by start_pool, and its size
+_pool = None
+_pool_processes = 0
+
+
+@contextmanager
+def open_pdf(source: PdfSource):
+    """Open a PDF from a path or a shared-memory block"""
+    if not isinstance(source, SharedPdf):
+        with fitz.open(source) as pdf_doc:
+            yield pdf_doc
+        return
+    
+    with open_shared_pdf(source) as pdf_doc:
+        yield pdf_doc
+
+
+def open_shared_pdf(source: SharedPdf):
+    """
+    Open a PDF held in shared memory. On Linux the block is a file under
+    /dev/shm that PyMuPDF reads in place. Elsewhere it is copied to bytes,
+    since the pinned PyMuPDF rejects memoryview streams ("bad type:
+    'stream'"), and detached from at once; the creator owns unlinking it.
+    """
+    path = os.path.join("/dev/shm", source.name.lstrip("/"))
+    if os.path.isfile(path) and os.path.getsize(path) == source.size:
+        return fitz.open(path)
+    shm = shared_memory.SharedMemory(name=source.name)
+    try:
+        data = bytes(shm.buf[:source.size])
+    finally:
+        shm.close()
+    return fitz.open(stream=data, filetype="pdf")
+
+
+def extract_pages(
+    source: PdfSource,
+    processes: int = 1,
+    shard_size: int = 32,
+    min_parallel_pages: int = 0,
+    start_page: int = 0
+):
+    """
+    Yield (page_number, text) for each page with text, 1-indexed, skipping
+    the first start_page pages. Uses a process pool when processes > 1 and
+    at least min_parallel_pages pages remain; otherwise extracts in this process.
+    """
+    with open_pdf(source) as pdf_doc:
+        page_total = len(pdf_doc)
+        if processes <= 1 or page_total - start_page < max(min_parallel_pages, 2):
+            yield from iter_pages(pdf_doc, start_page)
+            return
+    
+    yield from iter_pages_parallel(source, page_total, processes, shard_size, start_page)
+
+
+def extract_page_numbers(source: PdfSource, page_numbers):
+    """Yield (page_number, text) for the given 1-indexed pages that exist and have text"""
+    with open_pdf(source) as pdf_doc:
+        for page_number in sorted(set(page_numbers)):
+            if 1 <= page_number <= len(pdf_doc):
+                text = pdf_doc[page_number - 1].get_text()
+                if text.strip():
+                    yield page_number, text
+
+
+def count_pages(source: PdfSource) -> int:
+    with open_pdf(source) as pdf_doc:
+        return len(pdf_doc)
+
+
+def iter_pages(pdf_doc, start: int = 0, stop: int = None):
+    """Yield (page_number, text) for each page with text, 1-indexed"""
+    stop = len(pdf_doc) if stop is None else stop
+    for page_num in range(start, stop):
+        text = pdf_doc[page_num].get_text()
+        if text.strip():  # Only process pages with text
+            yield page_num + 1, text
+
+
+def iter_pages_parallel(source: PdfSource, page_total: int, processes: int, shard_size: int, start_page: int = 0):
+    """
+    Split the page range into shards and extract them across a process pool:
+    the one from start_pool if it has this many processes, else one for this
+    PDF. Results are yielded in page order; at most 2 shards per process are
+    in flight so memory stays bounded when the consumer is slower than the pool.
+    """
+    shards = (
+        (start, min(start + shard_size, page_total))
+        for start in range(start_page, page_total, shard_size)
+    )
+    if _pool is not None and _pool_processes == processes:
+        try:
+            yield from _extract_shards(_pool, source, shards, processes * 2)
+        except BrokenProcessPool:
+            # A process died (e.g. OOM-killed); replace the pool for the next PDF
+            start_pool(processes)
+            raise
+        return
+    
+    with _new_pool(processes) as pool:
+        yield from _extract_shards(pool, source, shards, processes * 2)
+
+
+def start_pool(processes: int):
+    """
+    Start the extraction pool kept for the life of this process, replacing
+    any previous one. Processes are started now, without waiting for them
+    to finish importing, so their start-up overlaps the caller's own.
+    """
+    global _pool, _pool_processes
+    shutdown_pool()
+    _pool, _pool_processes = _new_pool(processes), processes
+    for _ in range(processes):
+        _pool.submit(os.getpid)
+
+
+def shutdown_pool():
+    global _pool, _pool_processes
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool, _pool_processes = None, 0
+
+
+def _new_pool(processes: int) -> ProcessPoolExecutor:
+    # spawn rather than fork: the parent may already hold torch/BLAS threads
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _extract_shards(pool: ProcessPoolExecutor, source: PdfSource, shards, max_in_flight: int):
+    pending = deque()
+    try:
+        for shard in shards:
+            pending.append(pool.submit(_extract_shard, source, shard))
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # A consumer that stops early leaves nothing queued for the next PDF
+        for future in pending:
+            future.cancel()
+
+
+def _extract_shard(source: PdfSource, shard):
+    # Opened per shard: a pool process that kept a document open between
+    # PDFs would keep the previous PDF's shared memory alive after unlinking
+    start, stop = shard
+    with open_pdf(source) as pdf_doc:
+        return list(iter_pages(pdf_doc, start, stop))
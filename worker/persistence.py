@@ -0,0 +1,121 @@
+"""
+Bulk persistence for ingestion
+Writes Page and Chunk rows in one statement per batch instead of one ORM
+round trip per row. Page IDs are generated client-side so chunks can
+reference their page without flushing first.
+"""
+import csv
+import io
+import uuid
+from datetime import datetime
+from typing import Dict, List, Any
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.document import Page, Chunk
+
+
+PAGE_COLUMNS = ["id", "document_id", "page_number", "text", "created_at"]
+CHUNK_COLUMNS = [
+    "id", "document_id", "page_id", "page_number", "text",
+    "char_start", "char_end", "vector_id", "created_at"
+]
+
+
+def insert_pages(db: Session, document_id: uuid.UUID, pages: List[tuple], method: str = None) -> List[uuid.UUID]:
+    """Insert (page_number, text) pairs and return their generated page IDs"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "document_id": document_id,
+            "page_number": page_number,
+            "text": text,
+            "created_at": now
+        }
+        for page_number, text in pages
+    ]
+    _bulk_insert(db, Page.__table__, PAGE_COLUMNS, rows, method)
+    return [row["id"] for row in rows]
+
+
+def insert_chunks(db: Session, document_id: uuid.UUID, chunks: List[Dict[str, Any]], method: str = None) -> int:
+    """Insert chunk dicts (page_id, page_number, text, char_start, char_end, vector_id)"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "document_id": document_id,
+            "page_id": chunk["page_id"],
+            "page_number": chunk["page_number"],
+            "text": chunk["text"],
+            "char_start": chunk["char_start"],
+            "char_end": chunk["char_end"],
+            "vector_id": chunk["vector_id"],
+            "created_at": now
+        }
+        for chunk in chunks
+    ]
+    _bulk_insert(db, Chunk.__table__, CHUNK_COLUMNS, rows, method)
+    return len(rows)
+
+
+def copy_document_rows(db: Session, source_id: uuid.UUID, target_id: uuid.UUID):
+    """
+    Duplicate a processed document's pages and chunks server-side for a
+    deduplicated upload. Chunks keep their vector IDs, which index into the
+    shared FAISS index, and are re-pointed at the copied pages.
+    """
+    params = {"source_id": source_id, "target_id": target_id}
+    db.execute(text("""
+        INSERT INTO pages (id, document_id, page_number, text, created_at)
+        SELECT gen_random_uuid(), :target_id, page_number, text, now()
+        FROM pages WHERE document_id = :source_id
+    """), params)
+    db.execute(text("""
+        INSERT INTO chunks (id, document_id, page_id, page_number, text,
+                            char_start, char_end, heading_path, vector_id, created_at)
+        SELECT gen_random_uuid(), :target_id, p.id, c.page_number, c.text,
+               c.char_start, c.char_end, c.heading_path, c.vector_id, now()
+        FROM chunks c
+        JOIN pages p ON p.document_id = :target_id AND p.page_number = c.page_number
+        WHERE c.document_id = :source_id
+    """), params)
+
+
+def _bulk_insert(db: Session, table, columns: List[str], rows: List[Dict[str, Any]], method: str = None):
+    if not rows:
+        return
+    method = method or settings.INGEST_BULK_METHOD
+    if method == "copy" and db.get_bind().dialect.name == "postgresql":
+        _copy_rows(db, table.name, columns, rows)
+    else:
+        # executemany; SQLAlchemy 2.0 batches this into multi-row INSERTs
+        db.execute(insert(table), rows)
+
+
+def _copy_rows(db: Session, table_name: str, columns: List[str], rows: List[Dict[str, Any]]):
+    """Stream rows through PostgreSQL COPY on the session's own transaction"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(row[column]) for column in columns])
+    buffer.seek(0)
+    
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _copy_value(value):
+    # csv writes None as an empty unquoted field, which COPY reads as NULL
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
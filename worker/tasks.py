@@ -1,16 +1,30 @@
+import hashlib
 import os
+import resource
+import sys
 import tempfile
+import time
 import uuid
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from sqlalchemy import create_engine, delete
 from sqlalchemy.orm import sessionmaker
-import fitz  # PyMuPDF
+from rq import get_current_job
 
 from app.core.config import settings
 from app.models.user import User
 from app.models.document import Document, Page, Chunk, Figure
 from app.models.chat import Chat, Message, Citation
+from app.services.artifacts import artifact_store
+from app.services.lexical import BM25Builder
+from app.services.progress import ProgressReporter
 from app.services.storage import storage_service
-from app.services.vector import vector_service
+from app.services.vector import embedding_namespace, vector_service
+from app.services.worker import enqueue_compaction_job
+from checkpoint import IngestCheckpoint
+from chunking import make_chunker
+from extraction import SharedPdf, count_pages, extract_page_numbers, extract_pages
+from persistence import insert_pages, insert_chunks, copy_document_rows
 
 
 # Create database session
@@ -20,15 +34,19 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def ingest_document(doc_id: str, user_id: str):
     """
-    Main ingestion task:
-    1. Download PDF from MinIO
-    2. Extract text per page with PyMuPDF
-    3. Chunk paragraphs
-    4. Generate embeddings and create FAISS index
-    5. Save everything to database
+    Main ingestion task, run as a streaming pipeline so peak memory stays
+    flat regardless of page count:
+    1. Stream PDF from MinIO into memory; link existing artifacts if the bytes were seen before
+    2. Extract text per page with PyMuPDF (lazily, optionally across a process pool)
+    3. Chunk with the configured strategy (paragraph, sentence, token, cross_page)
+    4. Embed the batch and append it to the FAISS index
+    5. Persist the batch's pages and chunks, then drop them
+    6. Checkpoint the batch so a retried job resumes after it
     """
+    job_started = time.perf_counter()
     db = SessionLocal()
     document = None  # Initialize to avoid UnboundLocalError
+    progress = ProgressReporter(doc_id)
     
     try:
         # Get document
@@ -40,154 +58,424 @@ def ingest_document(doc_id: str, user_id: str):
         # Update status
         document.status = "running"
         db.commit()
+        progress.update("downloading")
         
-        # Download PDF from MinIO
+        # Fetch PDF from MinIO
         object_key = f"{user_id}/{doc_id}/{document.filename}"
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-        
-        try:
-            storage_service.download_file(object_key, tmp_path)
-            
-            # Extract text from PDF
-            print(f"Extracting text from {document.filename}")
-            pdf_doc = fitz.open(tmp_path)
-            
-            pages_data = []
-            for page_num in range(len(pdf_doc)):
-                page = pdf_doc[page_num]
-                text = page.get_text()
-                
-                if text.strip():  # Only process pages with text
-                    pages_data.append({
-                        "page_number": page_num + 1,  # 1-indexed
-                        "text": text
-                    })
-            
-            pdf_doc.close()
-            
-            # Update page count
-            document.page_count = len(pages_data)
-            db.commit()
-            
-            # Save pages to database
-            print(f"Saving {len(pages_data)} pages")
-            page_records = []
-            for page_data in pages_data:
-                page_record = Page(
-                    document_id=document.id,
-                    page_number=page_data["page_number"],
-                    text=page_data["text"]
-                )
-                db.add(page_record)
-                db.flush()
-                page_records.append(page_record)
+        with fetch_pdf(object_key) as (source, content_hash):
+            # Byte-identical PDFs already processed by this pipeline are linked, not rebuilt
+            index_dir = vector_service.get_index_dir(user_id, doc_id)
+            artifact_key = artifact_store.key(content_hash, _pipeline_fingerprint())
+            artifact_store.release(user_id, doc_id, index_dir)  # Never rebuild into a shared set
+            if settings.ENABLE_DEDUP and _link_existing_artifacts(db, document, artifact_key, user_id, doc_id):
+                print(f"Document {doc_id} linked to existing artifacts {artifact_key}")
+                progress.finish()
+                return
             
-            db.commit()
-            
-            # Chunk text
-            print("Chunking text")
-            chunks_data = []
-            for page_record, page_data in zip(page_records, pages_data):
-                page_chunks = chunk_text(
-                    page_data["text"],
-                    page_number=page_data["page_number"]
-                )
-                for chunk_info in page_chunks:
-                    chunks_data.append({
-                        "page_id": page_record.id,
-                        "page_number": page_data["page_number"],
-                        **chunk_info
-                    })
+            # Resume from the last committed batch, discarding anything after it
+            checkpoint = IngestCheckpoint(index_dir, vector_service.dimension)
+            state = checkpoint.load() or IngestCheckpoint.initial_state()
+            _discard_pages_after(db, document.id, state["last_page"])
             
-            print(f"Created {len(chunks_data)} chunks")
+            index = vector_service.new_index()
+            for vectors in checkpoint.iter_vectors(state["ntotal"]):
+                vector_service.add_embeddings(index, vectors)
+            lexical = BM25Builder()
+            if state["last_page"]:
+                _add_document_chunks(lexical, db, document.id)  # Committed before the checkpoint
+                print(f"Resuming after page {state['last_page']} ({state['chunk_count']} chunks checkpointed)")
             
-            # Generate embeddings and create FAISS index
-            print("Generating embeddings")
-            chunk_texts = [c["text"] for c in chunks_data]
-            index, vector_ids = vector_service.create_index(user_id, doc_id, chunk_texts)
+            print(f"Extracting text from {document.filename}")
+            progress.start(count_pages(source), state["last_page"], state["chunk_count"])
+            pages = extract_pages(
+                source,
+                processes=settings.MAX_CONCURRENT_WORKERS,
+                shard_size=settings.INGEST_BATCH_PAGES,
+                min_parallel_pages=settings.PARALLEL_EXTRACT_MIN_PAGES,
+                start_page=state["last_page"]
+            )
+            memory = StageMemory()
+            cache_stats = _embedding_cache_counts()
+            throughput_stats = _embedding_throughput_counts()
             
-            # Save chunks to database with vector IDs
-            print("Saving chunks to database")
-            for chunk_data, vector_id in zip(chunks_data, vector_ids):
-                chunk_record = Chunk(
-                    document_id=document.id,
-                    page_id=chunk_data["page_id"],
-                    page_number=chunk_data["page_number"],
-                    text=chunk_data["text"],
-                    char_start=chunk_data["char_start"],
-                    char_end=chunk_data["char_end"],
-                    vector_id=vector_id
-                )
-                db.add(chunk_record)
+            for page_batch in iter_batches(pages, settings.INGEST_BATCH_PAGES):
+                memory.record("extract")
+                chunk_count, embeddings = _process_page_batch(db, document, page_batch, index, lexical, memory, progress)
+                state = {
+                    "last_page": page_batch[-1][0],
+                    "page_count": state["page_count"] + len(page_batch),
+                    "chunk_count": state["chunk_count"] + chunk_count,
+                    "ntotal": index.ntotal
+                }
+                checkpoint.commit(embeddings, state)
+                if embeddings is not None and job_started is not None:
+                    # With a resident model this excludes the model load
+                    print(f"Job start to first embedded batch: {time.perf_counter() - job_started:.1f}s")
+                    job_started = None
+                del embeddings
+                memory.record("checkpoint")
+                progress.update("extracting", pages_done=state["last_page"], chunks_embedded=state["chunk_count"])
+                print(f"Processed {state['page_count']} pages, {state['chunk_count']} chunks")
             
-            db.commit()
+            # Save the index once every batch has been appended
+            progress.update("indexing")
+            vector_service.save_index(user_id, doc_id, index, lexical.build())
+            checkpoint.clear()
+            if settings.ENABLE_DEDUP:
+                artifact_store.publish(artifact_key, user_id, doc_id, index_dir)
+            memory.record("index")
             
             # Mark as done
+            document.page_count = state["page_count"]
             document.status = "done"
             db.commit()
+            progress.finish()
+            memory.report()
+            _report_embedding_cache(cache_stats)
+            _report_embedding_throughput(throughput_stats)
             print(f"Document {doc_id} ingestion complete")
-            
-        finally:
-            # Clean up temp file
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
     
     except Exception as e:
-        print(f"Error ingesting document {doc_id}: {e}")
+        # RQ decrements retries_left after this handler; until the last attempt it re-enqueues the job
+        job = get_current_job()
+        retrying = bool(job and job.retries_left)
+        print(f"Error ingesting document {doc_id}{' (will retry)' if retrying else ''}: {e}")
         if document:  # Only update if document was found
-            document.status = "error"
+            db.rollback()
+            document.status = "queued" if retrying else "error"
             document.error_message = str(e)
             db.commit()
+            progress.finish(error=str(e), retrying=retrying)
+        raise
+    
+    finally:
+        db.close()
+
+
+def reingest_pages(doc_id: str, user_id: str, page_numbers: list):
+    """
+    Re-extract the given pages and apply the chunk difference in place:
+    unchanged chunks keep their vector IDs and only new texts are embedded.
+    The index is written before the rows commit, so a retry re-applies it.
+    """
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == uuid.UUID(doc_id)).first()
+        if not document or document.status != "done":
+            print(f"Document {doc_id} is not ingested; nothing to re-ingest")
+            return
+        page_numbers = sorted(set(page_numbers))
+        
+        # A deduplicated document gets its own copy of the shared index first
+        index_dir = vector_service.get_index_dir(user_id, doc_id)
+        if artifact_store.detach(user_id, doc_id, index_dir):
+            print(f"Document {doc_id} detached from shared artifacts")
+        
+        with fetch_pdf(f"{user_id}/{doc_id}/{document.filename}") as (source, _):
+            page_texts = list(extract_page_numbers(source, page_numbers))
+        
+        # Consecutive pages are chunked together so cross_page chunks can span them;
+        # a chunk starting before the first given page belongs to that page and keeps its old text
+        chunker = _make_chunker()
+        new_chunks = []
+        for position, (page_number, text) in enumerate(page_texts):
+            new_chunks.extend(chunker.feed(page_number, text))
+            if position + 1 == len(page_texts) or page_texts[position + 1][0] != page_number + 1:
+                new_chunks.extend(chunker.flush())
+        
+        # Pages keep their rows (and IDs) when they still have text
+        pages = {
+            page.page_number: page
+            for page in db.query(Page).filter(Page.document_id == document.id, Page.page_number.in_(page_numbers))
+        }
+        texts_by_number = dict(page_texts)
+        for page_number, page in pages.items():
+            if page_number in texts_by_number:
+                page.text = texts_by_number[page_number]
+        added_pages = [(number, text) for number, text in page_texts if number not in pages]
+        page_ids = {number: page.id for number, page in pages.items()}
+        page_ids.update(zip((number for number, _ in added_pages), insert_pages(db, document.id, added_pages)))
+        emptied_pages = [number for number in pages if number not in texts_by_number]
+        
+        # Match new chunks to existing ones by text
+        old_by_text = {}
+        for chunk in db.query(Chunk).filter(Chunk.document_id == document.id, Chunk.page_number.in_(page_numbers)):
+            old_by_text.setdefault(chunk.text, []).append(chunk)
+        added = []
+        kept = []
+        for chunk_data in new_chunks:
+            chunk_data["page_id"] = page_ids[chunk_data["page_number"]]
+            matches = old_by_text.get(chunk_data["text"])
+            if not matches:
+                added.append(chunk_data)
+                continue
+            chunk = matches.pop()
+            kept.append(chunk)
+            for field in ("page_id", "page_number", "char_start", "char_end"):
+                setattr(chunk, field, chunk_data[field])
+        removed = [chunk for chunks in old_by_text.values() for chunk in chunks]
+        
+        meta = None
+        if added or removed:
+            # The BM25 index is rebuilt from every surviving chunk; it is cheap next to embedding
+            lexical = BM25Builder()
+            _add_document_chunks(lexical, db, document.id, exclude_pages=page_numbers)
+            lexical.add([chunk.vector_id for chunk in kept], [chunk.text for chunk in kept])
+            
+            texts = [c["text"] for c in added]
+            vector_ids, meta = vector_service.update_index(
+                user_id, doc_id, vector_service.embed_documents(texts),
+                [chunk.vector_id for chunk in removed], lexical, texts
+            )
+            for chunk_data, vector_id in zip(added, vector_ids):
+                chunk_data["vector_id"] = vector_id
+        
+        for chunk in removed:
+            db.delete(chunk)
+        db.flush()  # Chunks go before the pages they reference
+        if emptied_pages:
+            db.execute(delete(Page.__table__).where(
+                Page.__table__.c.document_id == document.id,
+                Page.__table__.c.page_number.in_(emptied_pages)
+            ))
+        insert_chunks(db, document.id, added)
+        if document.page_count is not None:
+            document.page_count += len(added_pages) - len(emptied_pages)
+        db.commit()
+        print(f"Re-ingested pages {page_numbers} of {doc_id}: {len(kept)} chunks kept, "
+              f"{len(added)} added, {len(removed)} removed")
+        
+        if meta is not None and vector_service.needs_compaction(meta):
+            enqueue_compaction_job(doc_id, user_id)
+    
+    except Exception as e:
+        print(f"Error re-ingesting pages of document {doc_id}: {e}")
+        db.rollback()
         raise
     
     finally:
         db.close()
 
 
-def chunk_text(text: str, page_number: int, chunk_size: int = 600, overlap: int = 80):
+def compact_index(doc_id: str, user_id: str):
+    """Background rebuild of a document's index once re-ingestion has tombstoned enough vectors"""
+    if not os.path.exists(os.path.join(vector_service.get_index_dir(user_id, doc_id), "index.faiss")):
+        print(f"Document {doc_id} has no index; nothing to compact")
+        return
+    vector_service.compact_index(user_id, doc_id)
+
+
+@contextmanager
+def fetch_pdf(object_key: str):
     """
-    Chunk text into overlapping segments.
-    Simple implementation - in production, use paragraph-aware chunking.
+    Yield (source, sha256) for a stored PDF. With INGEST_STREAMING the bytes
+    go straight from parallel ranged GETs into a named shared-memory block
+    that PyMuPDF and the extraction pool read; otherwise the PDF is
+    downloaded to a temp file as before.
     """
-    chunks = []
+    if not settings.INGEST_STREAMING:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+        try:
+            storage_service.download_file(object_key, tmp_path)
+            yield tmp_path, artifact_store.hash_file(tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return
+    
+    allocated = {}
     
-    # Split by double newlines (paragraphs)
-    paragraphs = text.split('\n\n')
+    def allocate(size: int):
+        allocated["size"] = size
+        allocated["shm"] = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        return allocated["shm"].buf
+    
+    try:
+        storage_service.download_to_buffer(object_key, allocate)
+        shm, size = allocated["shm"], allocated["size"]
+        with shm.buf[:size] as view:
+            content_hash = hashlib.sha256(view).hexdigest()
+        yield SharedPdf(shm.name, size), content_hash
+    finally:
+        if "shm" in allocated:
+            allocated["shm"].close()
+            allocated["shm"].unlink()
+
+
+def _process_page_batch(db, document, page_batch, index, lexical, memory, progress):
+    """
+    Persist, chunk, embed and index (dense and BM25) one batch of (page_number, text) pairs.
+    Returns the chunk count and the batch embeddings (None if no chunks) so
+    the caller can checkpoint them once the rows are committed.
+    """
+    # Save pages in one statement; IDs are generated client-side
+    page_ids = insert_pages(db, document.id, page_batch)
+    memory.record("pages")
     
-    current_chunk = ""
-    char_start = 0
+    # Chunk text; cross-page chunks belong to the page they start on
+    page_ids_by_number = {page_number: page_id for page_id, (page_number, _) in zip(page_ids, page_batch)}
+    chunker = _make_chunker()
+    chunks_data = []
+    for page_number, text in page_batch:
+        chunks_data.extend(chunker.feed(page_number, text))
+    chunks_data.extend(chunker.flush())
+    for chunk_data in chunks_data:
+        chunk_data["page_id"] = page_ids_by_number[chunk_data["page_number"]]
+    memory.record("chunk")
     
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
+    embeddings = None
+    if chunks_data:
+        # Generate embeddings and append them to the index
+        progress.update("embedding")
+        embeddings = vector_service.embed_documents([c["text"] for c in chunks_data])
+        vector_ids = vector_service.add_embeddings(index, embeddings)
+        lexical.add(vector_ids, (c["text"] for c in chunks_data))
+        memory.record("embed")
         
-        # If adding this paragraph exceeds chunk_size, save current chunk
-        if current_chunk and len(current_chunk) + len(para) > chunk_size:
-            chunks.append({
-                "text": current_chunk.strip(),
-                "char_start": char_start,
-                "char_end": char_start + len(current_chunk)
-            })
-            
-            # Start new chunk with overlap
-            overlap_text = current_chunk[-overlap:] if len(current_chunk) > overlap else current_chunk
-            current_chunk = overlap_text + " " + para
-            char_start = char_start + len(current_chunk) - len(overlap_text) - len(para) - 1
-        else:
-            if current_chunk:
-                current_chunk += " " + para
-            else:
-                current_chunk = para
-    
-    # Add final chunk
-    if current_chunk:
-        chunks.append({
-            "text": current_chunk.strip(),
-            "char_start": char_start,
-            "char_end": char_start + len(current_chunk)
-        })
-    
-    return chunks
+        # Save chunks to database with vector IDs
+        progress.update("persisting")
+        for chunk_data, vector_id in zip(chunks_data, vector_ids):
+            chunk_data["vector_id"] = vector_id
+        insert_chunks(db, document.id, chunks_data)
+    
+    db.commit()
+    memory.record("persist")
+    return len(chunks_data), embeddings
+
+
+def _add_document_chunks(lexical, db, document_id, exclude_pages=()):
+    """Add a document's committed chunks to a BM25 builder, optionally skipping some pages"""
+    query = db.query(Chunk.vector_id, Chunk.text).filter(Chunk.document_id == document_id)
+    if exclude_pages:
+        query = query.filter(Chunk.page_number.notin_(exclude_pages))
+    rows = query.order_by(Chunk.vector_id).all()
+    lexical.add([row.vector_id for row in rows], [row.text for row in rows])
+
+
+def _pipeline_fingerprint() -> str:
+    """Anything that changes the pages, chunks, vectors or index produced must change this"""
+    return (
+        f"{embedding_namespace()}|{settings.CHUNK_STRATEGY}"
+        f"|{settings.CHUNK_SIZE}/{settings.CHUNK_OVERLAP}|chunking-v2"
+        f"|{settings.INDEX_TYPE}/{settings.INDEX_FLAT_MAX_VECTORS}/{settings.INDEX_TARGET_RECALL}|bm25-v1"
+    )
+
+
+def _link_existing_artifacts(db, document, artifact_key: str, user_id: str, doc_id: str) -> bool:
+    """Reuse another finished document's rows and index if it has the same content"""
+    owner_doc_ids = [
+        uuid.UUID(owner_doc_id)
+        for _, owner_doc_id in artifact_store.owners(artifact_key)
+        if owner_doc_id != doc_id
+    ]
+    if not owner_doc_ids:
+        return False
+    
+    source = db.query(Document).filter(
+        Document.id.in_(owner_doc_ids),
+        Document.status == "done"
+    ).first()
+    if not source:
+        return False
+    
+    # One transaction: if linking fails, the rollback restores any rows
+    # (and the checkpoint that covers them) from an earlier attempt
+    _discard_pages_after(db, document.id, 0, commit=False)
+    copy_document_rows(db, source.id, document.id)
+    if not artifact_store.link(artifact_key, user_id, doc_id, vector_service.get_index_dir(user_id, doc_id)):
+        db.rollback()
+        return False
+    if settings.INDEX_REMOTE_ENABLED:
+        vector_service.publish_index(user_id, doc_id)
+    
+    document.page_count = source.page_count
+    document.status = "done"
+    db.commit()
+    return True
+
+
+def _discard_pages_after(db, document_id, last_page: int, commit: bool = True):
+    """Delete pages and chunks past the checkpoint, e.g. from a failed attempt"""
+    db.execute(delete(Chunk.__table__).where(
+        Chunk.__table__.c.document_id == document_id,
+        Chunk.__table__.c.page_number > last_page
+    ))
+    db.execute(delete(Page.__table__).where(
+        Page.__table__.c.document_id == document_id,
+        Page.__table__.c.page_number > last_page
+    ))
+    if commit:
+        db.commit()
+
+
+def _embedding_cache_counts():
+    cache = vector_service.embedding_cache
+    return (cache.hits, cache.misses) if cache else (0, 0)
+
+
+def _report_embedding_cache(before):
+    """Print this document's embedding cache hit rate"""
+    hits, misses = (now - then for now, then in zip(_embedding_cache_counts(), before))
+    if hits + misses:
+        print(f"  embedding cache: {hits} hits, {misses} misses ({hits / (hits + misses):.1%} hit rate)")
+
+
+def _embedding_throughput_counts():
+    return vector_service.embedded_chunks, vector_service.embedded_tokens, vector_service.embedding_seconds
+
+
+def _report_embedding_throughput(before):
+    """Print this document's model embedding rate (cache hits excluded)"""
+    chunks, tokens, seconds = (now - then for now, then in zip(_embedding_throughput_counts(), before))
+    if seconds > 0:
+        print(f"  embedding: {chunks} chunks in {seconds:.1f}s ({chunks / seconds:.1f} chunks/s, "
+              f"{tokens / seconds:.0f} tokens/s, {settings.EMBEDDING_BATCH_TOKENS} token batches)")
+
+
+def iter_batches(items, batch_size: int):
+    """Group an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def current_rss_mb() -> float:
+    """Current resident set size in MB, or 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def _max_rss_mb() -> float:
+    """Process-lifetime peak RSS in MB (ru_maxrss is KB on Linux, bytes on macOS)"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+class StageMemory:
+    """Tracks the highest RSS observed at the end of each ingestion stage"""
+    
+    def __init__(self):
+        self.peaks = {}
+    
+    def record(self, stage: str):
+        rss = current_rss_mb()
+        self.peaks[stage] = max(self.peaks.get(stage, 0.0), rss)
+    
+    def report(self):
+        for stage, peak in self.peaks.items():
+            print(f"  peak RSS after {stage}: {peak:.1f} MB")
+        print(f"  process peak RSS: {_max_rss_mb():.1f} MB")
+
 
+def _make_chunker():
+    tokenizer = vector_service.get_tokenizer() if settings.CHUNK_STRATEGY == "token" else None
+    return make_chunker(settings.CHUNK_STRATEGY, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP, tokenizer)
@@ -0,0 +1,85 @@
+"""
+Offset invariants of every chunking strategy, checked on randomized pages.
+"""
+import os
+import random
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from chunking import STRATEGIES, TokenMeasure, make_chunker
+
+TRIALS = 200
+WORDS = (
+    "stress strain modulus Poisson's ratio eq. 4.12 yield shear beam torsion "
+    "deflection (see Fig. 3) E = 200 GPa elastic plastic the of a and to in"
+).split()
+
+
+def fake_tokenizer(text, add_special_tokens=False, return_offsets_mapping=False):
+    """Stand-in for the embedding tokenizer: word pieces of up to 4 characters and single punctuation marks"""
+    return {"offset_mapping": [match.span() for match in re.finditer(r"\w{1,4}|[^\w\s]", text)]}
+
+
+def random_page(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(0, 14)):
+        sentences = []
+        for _ in range(rng.randint(1, 7)):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 45)))
+            sentences.append(words + rng.choice([".", "!", "?", "", ":"]))
+        paragraphs.append(rng.choice([" ", "\n"]).join(sentences))
+    separator = rng.choice(["\n\n", "\n \n", "\n\n\n"])
+    return rng.choice(["", "  \n"]) + separator.join(paragraphs) + rng.choice(["", "\n", " \n\n"])
+
+
+def chunk_pages(chunker, pages):
+    chunks = []
+    for page_number, text in pages:
+        chunks.extend(chunker.feed(page_number, text))
+    chunks.extend(chunker.flush())
+    return chunks
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_chunk_offsets(strategy):
+    """
+    For every chunk:
+    - text is non-empty and has no leading/trailing whitespace
+    - single-page strategies: page_text[char_start:char_end] == text, and
+      every non-whitespace character of every page is in some chunk
+    - cross_page: text starts with page_text[char_start:char_end]
+    - chunks never exceed the budget (characters, or tokens for token)
+    """
+    rng = random.Random(0)
+    for trial in range(TRIALS):
+        budget = rng.choice([40, 200, 600])
+        overlap = rng.choice([0, 20, 80])
+        pages = [(n + 1, random_page(rng)) for n in range(rng.randint(1, 6))]
+        texts = dict(pages)
+        measures = {n: TokenMeasure(text, fake_tokenizer) for n, text in pages} if strategy == "token" else {}
+        covered = {n: bytearray(len(text)) for n, text in pages}
+        chunker = make_chunker(strategy, budget, overlap, fake_tokenizer)
+        
+        for chunk in chunk_pages(chunker, pages):
+            page_text = texts[chunk["page_number"]]
+            start, end = chunk["char_start"], chunk["char_end"]
+            case = f"trial {trial} budget {budget} overlap {overlap}: {chunk!r}"
+            assert chunk["text"] and chunk["text"] == chunk["text"].strip(), case
+            if strategy == "cross_page":
+                assert chunk["text"].startswith(page_text[start:end]), case
+                assert len(chunk["text"]) <= budget, case
+            else:
+                assert page_text[start:end] == chunk["text"], case
+                size = (measures[chunk["page_number"]].size(start, end)
+                        if strategy == "token" else len(chunk["text"]))
+                assert size <= budget, case
+            covered[chunk["page_number"]][start:end] = b"\x01" * (end - start)
+        
+        if strategy != "cross_page":
+            for n, text in pages:
+                for match in re.finditer(r"\S", text):
+                    assert covered[n][match.start()], f"trial {trial}: page {n} char {match.start()} not covered"
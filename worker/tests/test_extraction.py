@@ -0,0 +1,63 @@
+"""
+Smoke test: a real PDF opened through the shared-memory path that streaming
+ingestion uses (INGEST_STREAMING), in process and across the pool.
+"""
+import os
+import sys
+from multiprocessing import shared_memory
+
+import fitz  # PyMuPDF
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from extraction import SharedPdf, count_pages, extract_page_numbers, extract_pages, shutdown_pool, start_pool
+
+PAGE_TOTAL = 6
+
+
+@pytest.fixture
+def shared_pdf():
+    pdf_doc = fitz.open()
+    for page_num in range(PAGE_TOTAL):
+        pdf_doc.new_page().insert_text((72, 72), f"Shared memory page {page_num + 1}")
+    data = pdf_doc.tobytes()
+    pdf_doc.close()
+    
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    try:
+        yield SharedPdf(shm.name, len(data))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def test_count_pages(shared_pdf):
+    assert count_pages(shared_pdf) == PAGE_TOTAL
+
+
+def test_extract_pages_in_process(shared_pdf):
+    pages = list(extract_pages(shared_pdf))
+    assert [page_number for page_number, _ in pages] == list(range(1, PAGE_TOTAL + 1))
+    assert "Shared memory page 3" in pages[2][1]
+
+
+def test_extract_pages_across_pool(shared_pdf):
+    pages = list(extract_pages(shared_pdf, processes=2, shard_size=2))
+    assert [page_number for page_number, _ in pages] == list(range(1, PAGE_TOTAL + 1))
+
+
+def test_extract_pages_across_kept_pool(shared_pdf):
+    # The resident worker's pool serves one PDF after another
+    start_pool(2)
+    try:
+        for start_page in (0, 3):
+            pages = list(extract_pages(shared_pdf, processes=2, shard_size=2, start_page=start_page))
+            assert [page_number for page_number, _ in pages] == list(range(start_page + 1, PAGE_TOTAL + 1))
+    finally:
+        shutdown_pool()
+
+
+def test_extract_page_numbers(shared_pdf):
+    assert [page_number for page_number, _ in extract_page_numbers(shared_pdf, [5, 2, 99])] == [2, 5]
@@ -2,32 +2,189 @@
 """
 RQ Worker
 Processes background jobs from Redis queue
+
+Usage: python worker.py [--mode resident|fork] [queue ...]
+Listens on every ingestion queue by default; pass queue names to dedicate
+a worker to a subset (e.g. a separate pool for ingest-large).
+
+In resident mode (WORKER_MODE, the default) jobs run in the worker process
+itself, so the embedding model and the PDF extraction pool are started
+once instead of once per job. The worker exits after WORKER_MAX_JOBS
+jobs, past WORKER_MAX_RSS_MB, or if the model stops answering a health
+probe; the container restart policy brings up a fresh one.
 """
 import sys
 import os
+import argparse
+import random
+import socket
+import time
+from datetime import datetime
+
+PROCESS_STARTED = time.perf_counter()
 
 # Add both backend AND worker to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 sys.path.insert(0, os.path.dirname(__file__))  # Add worker directory
 
 from redis import Redis
-from rq import Worker, Queue
+from rq import Worker, SimpleWorker, Queue
+from rq.worker import StopRequested
 from app.core.config import settings
+from app.services.vector import vector_service
+from app.services.worker import INGEST_QUEUE_NAMES, publish_worker_health, record_queue_wait
 
 # Import tasks so RQ can find them
 import tasks  # This makes tasks.ingest_document available
+import extraction
 
 # Connect to Redis
 redis_conn = Redis.from_url(settings.REDIS_URL)
 
+
+class WeightedWorker(Worker):
+    """
+    Drains several queues by weight instead of strict priority: after each
+    dequeue the queue order is redrawn so a queue is tried first with
+    probability proportional to INGEST_QUEUE_WEIGHTS. Small uploads get
+    most turns without starving large ones.
+    """
+    
+    def reorder_queues(self, reference_queue):
+        remaining = list(self._ordered_queues)
+        ordered = []
+        while remaining:
+            weights = [settings.INGEST_QUEUE_WEIGHTS.get(queue.name, 1) for queue in remaining]
+            queue = random.choices(remaining, weights=weights)[0]
+            remaining.remove(queue)
+            ordered.append(queue)
+        self._ordered_queues = ordered
+    
+    def execute_job(self, job, queue):
+        # rq stores naive UTC datetimes
+        if job.enqueued_at:
+            wait = (datetime.utcnow() - job.enqueued_at).total_seconds()
+            try:
+                record_queue_wait(queue.name, wait)
+            except Exception as e:
+                print(f"Failed to record queue wait: {e}")
+            print(f"Job {job.id} waited {wait:.1f}s on {queue.name}")
+        return super().execute_job(job, queue)
+
+
+class ResidentWorker(WeightedWorker, SimpleWorker):
+    """
+    Runs jobs in-process so the VectorService model stays loaded between
+    documents. Probes the model and publishes health after every job and,
+    while idle, every WORKER_HEALTH_INTERVAL_SECONDS from the RQ heartbeat;
+    stops itself when it should be recycled.
+    """
+    
+    def __init__(self, *args, startup=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.startup = startup or {}
+        self.jobs_done = 0
+        self.recycle_reason = None
+        self.health_checked_at = time.monotonic()
+    
+    @property
+    def dequeue_timeout(self) -> int:
+        # Blocking dequeues return this often when idle, so heartbeat() runs
+        return min(super().dequeue_timeout, settings.WORKER_HEALTH_INTERVAL_SECONDS)
+    
+    def heartbeat(self, timeout=None, pipeline=None):
+        super().heartbeat(timeout, pipeline)
+        # Without a pipeline this is the dequeue loop (or just after a job), never mid-job
+        if pipeline is None and time.monotonic() - self.health_checked_at >= settings.WORKER_HEALTH_INTERVAL_SECONDS:
+            self.check_health()
+            if self.recycle_reason:
+                raise StopRequested()  # Stop before dequeuing another job, not after running it
+    
+    def execute_job(self, job, queue):
+        try:
+            return super().execute_job(job, queue)
+        finally:
+            self.jobs_done += 1
+            self.check_health()
+    
+    def check_health(self):
+        self.health_checked_at = time.monotonic()
+        rss_mb = tasks.current_rss_mb()
+        probe_seconds = None
+        try:
+            started = time.perf_counter()
+            vector_service.embed_texts(["health probe"])
+            probe_seconds = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            self.recycle_reason = f"embedding probe failed: {e}"
+        
+        if self.recycle_reason is None:
+            if self.jobs_done >= settings.WORKER_MAX_JOBS:
+                self.recycle_reason = f"reached {self.jobs_done} jobs"
+            elif rss_mb > settings.WORKER_MAX_RSS_MB:
+                self.recycle_reason = f"RSS {rss_mb:.0f} MB over {settings.WORKER_MAX_RSS_MB} MB"
+        
+        publish_health(self, mode="resident", rss_mb=rss_mb, probe_seconds=probe_seconds)
+        if self.recycle_reason:
+            print(f"Recycling worker: {self.recycle_reason}")
+            self._stop_requested = True  # Checked by Worker.work() before the next dequeue
+
+
+def publish_health(worker, **fields):
+    try:
+        publish_worker_health(worker.name, {
+            "worker": worker.name,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "queues": [queue.name for queue in worker.queues],
+            "jobs_done": getattr(worker, "jobs_done", None),
+            "model_loaded": vector_service.model is not None or vector_service.embedding_client is not None,
+            "startup": getattr(worker, "startup", None),
+            "recycle_reason": getattr(worker, "recycle_reason", None),
+            "updated_at": time.time(),
+            **fields
+        })
+    except Exception as e:
+        print(f"Failed to publish worker health: {e}")
+
+
+def load_model() -> dict:
+    """Load the embedding model up front and report startup-to-first-embedding time"""
+    timings = vector_service.warm_up()
+    timings["startup_to_first_embedding_seconds"] = round(time.perf_counter() - PROCESS_STARTED, 3)
+    print(
+        f"Model resident: load {timings['model_load_seconds']:.1f}s, "
+        f"first embedding {timings['first_embedding_seconds']:.2f}s, "
+        f"process start to first embedding {timings['startup_to_first_embedding_seconds']:.1f}s"
+    )
+    return timings
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="RQ ingestion worker")
+    parser.add_argument("--mode", choices=["resident", "fork"], default=settings.WORKER_MODE)
+    parser.add_argument("queues", nargs="*", default=INGEST_QUEUE_NAMES + ['default'])
+    args = parser.parse_args()
+    
     # Create worker
-    queue = Queue('default', connection=redis_conn)
-    worker = Worker([queue], connection=redis_conn)
+    queues = [Queue(name, connection=redis_conn) for name in args.queues]
+    if args.mode == "resident":
+        if settings.MAX_CONCURRENT_WORKERS > 1:
+            # Kept across jobs; its processes import while the model loads
+            extraction.start_pool(settings.MAX_CONCURRENT_WORKERS)
+        worker = ResidentWorker(queues, connection=redis_conn, startup=load_model())
+        publish_health(worker, mode="resident", rss_mb=tasks.current_rss_mb())
+    else:
+        worker = WeightedWorker(queues, connection=redis_conn)
     
-    print("Starting RQ worker...")
+    print(f"Starting RQ worker ({args.mode} mode)...")
     print(f"Connected to Redis: {settings.REDIS_URL}")
-    print(f"Listening on queue: default")
+    print(f"Listening on queues: {', '.join(args.queues)}")
     
-    # Start processing jobs
-    worker.work()
\ No newline at end of file
+    # Start processing jobs. Retries wait INGEST_RETRY_INTERVAL_SECONDS in the
+    # ScheduledJobRegistry; the scheduler (one active per queue across workers)
+    # moves them back onto their queue when due
+    try:
+        worker.work(with_scheduler=True)
+    finally:
+        extraction.shutdown_pool()